@@ -17,6 +17,7 @@ Endpoints:
   POST   /admin/api/sync-from-bb        → pull latest from Bitbucket + reload
 """
 
+import asyncio
 import json
 import logging
 from typing import Optional
@@ -155,7 +156,7 @@ async def update_rule(rule_id: str, update: RuleUpdate):
         raise HTTPException(500, f"Commit failed: {result['message']}")
 
     # Reload engine
-    rule_engine.reload()
+    await asyncio.to_thread(rule_engine.reload)
 
     return {
         "success": True,
@@ -190,7 +191,7 @@ async def toggle_rule(rule_id: str, toggle: RuleToggle):
     result = await bb_client.commit_file(RULES_FILE_PATH, new_json, msg)
 
     if result["success"]:
-        rule_engine.reload()
+        await asyncio.to_thread(rule_engine.reload)
 
     return {"success": result["success"], "active": toggle.active, "message": result["message"]}
 
@@ -266,7 +267,7 @@ async def update_message(name: str, update: MessageUpdate):
         raise HTTPException(500, f"Commit failed: {result['message']}")
 
     # Reload messages
-    msg_resolver.reload()
+    await asyncio.to_thread(msg_resolver.reload)
 
     return {"success": True, "commit": result["commit_hash"], "message": result["message"]}
 
@@ -285,7 +286,7 @@ async def create_message(create: MessageCreate):
     result = await bb_client.commit_file(file_path, create.content, msg, create.author)
 
     if result["success"]:
-        msg_resolver.reload()
+        await asyncio.to_thread(msg_resolver.reload)
 
     return {"success": result["success"], "commit": result["commit_hash"], "message": result["message"]}
 
@@ -346,8 +347,8 @@ async def sync_from_bitbucket():
             local_path.write_text(content, encoding="utf-8")
 
     # Reload
-    rule_engine.reload()
-    msg_resolver.reload()
+    await asyncio.to_thread(rule_engine.reload)
+    await asyncio.to_thread(msg_resolver.reload)
 
     return {
         "success": True,
@@ -8,12 +8,19 @@ Orchestrates the full flow:
   4. Message resolver renders the Markdown template
 """
 
+import asyncio
 import logging
+import re
+from typing import AsyncIterator, Callable, Optional
+
+import markdown
+
 from engine.rule_engine import RuleEngine
 from engine.message_resolver import MessageResolver
 from engine.context_extractor import ContextExtractor
-from engine.data_sources import DataSourceResolver
-from api.models import ChatRequest, ChatResponse, EvaluateRequest
+from engine.data_sources import AsyncDataSourceResolver, DataSourceResolver, LazyDataSources
+from engine.worker_pool import WorkerPool
+from api.models import ChatRequest, ChatResponse, EvaluateRequest, MessageFormat
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +35,42 @@ A representative can help determine:
 - Any state-specific requirements that may apply
 """
 
+# Fixed text, so rendered once here rather than per no-match response
+NO_MATCH_HTML = markdown.markdown(NO_MATCH_MESSAGE)
+
+DEFAULT_FORMAT = "both"
+
+# Streamed messages are sent one Markdown block (paragraph, list, table) at a time
+MESSAGE_BLOCK_SPLIT = re.compile(r"(?<=\n\n)")
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> MessageFormat:
+    """
+    Pick the message renderings for a response: an explicit format wins,
+    otherwise an Accept header naming only text/markdown or only text/html.
+    The response itself is always JSON.
+    """
+    if requested:
+        return requested
+    media_types = {part.split(";")[0].strip().lower() for part in (accept or "").split(",")}
+    wants_markdown = "text/markdown" in media_types
+    wants_html = "text/html" in media_types
+    if wants_markdown and not wants_html:
+        return "markdown"
+    if wants_html and not wants_markdown:
+        return "html"
+    return DEFAULT_FORMAT
+
+
+def _message_fields(markdown_text: str, html: Optional[str], message_format: str) -> dict:
+    """ChatResponse message fields for the requested format (others left unset)."""
+    fields = {}
+    if message_format != "html":
+        fields["message"] = markdown_text
+    if message_format != "markdown":
+        fields["message_html"] = html
+    return fields
+
 
 def process_chat(
     request: ChatRequest,
@@ -35,13 +78,17 @@ def process_chat(
     rule_engine: RuleEngine,
     message_resolver: MessageResolver,
     data_resolver: DataSourceResolver,
+    message_format: Optional[MessageFormat] = None,
 ) -> ChatResponse:
     """
     Process a user's chat message through the full pipeline.
 
     Flow:
         User message → AI extract → data sources → rule engine → message
+
+    message_format overrides request.format (e.g. after Accept negotiation).
     """
+    message_format = message_format or request.format or DEFAULT_FORMAT
     user_msg = request.message
     logger.info(f"Processing chat: {user_msg[:100]}...")
 
@@ -49,23 +96,77 @@ def process_chat(
     context = extractor.extract(user_msg)
     logger.info(f"Step 1 - Extracted context: {context}")
 
-    # ─── Step 2: Resolve data sources ───
-    ds_results = data_resolver.resolve_all(context)
-    logger.info(f"Step 2 - Data sources resolved: { {k: bool(v) for k, v in ds_results.items()} }")
+    # ─── Step 2: Data sources — fetched lazily, only those the rules read ───
+    ds_results = data_resolver.lazy(context)
+    logger.info("Step 2 - Data sources deferred until a rule reads them")
+
+    return _chat_response(context, ds_results, rule_engine, message_resolver, message_format)
+
+
+async def process_chat_async(
+    request: ChatRequest,
+    extractor: ContextExtractor,
+    rule_engine: RuleEngine,
+    message_resolver: MessageResolver,
+    data_resolver: AsyncDataSourceResolver,
+    message_format: Optional[MessageFormat] = None,
+    pool: Optional[WorkerPool] = None,
+) -> ChatResponse:
+    """
+    process_chat for the event loop: extraction awaits the async OpenAI
+    client, data sources are fetched lazily through AsyncDataSourceResolver,
+    and evaluation + rendering run on pool (see _run_pipeline_stage).
+    """
+    message_format = message_format or request.format or DEFAULT_FORMAT
+    user_msg = request.message
+    logger.info(f"Processing chat: {user_msg[:100]}...")
+
+    # ─── Step 1: Extract structured context from natural language ───
+    context = await extractor.extract_async(user_msg)
+    logger.info(f"Step 1 - Extracted context: {context}")
+
+    # ─── Step 2: Data sources — fetched lazily, only those the rules read ───
+    ds_results = data_resolver.lazy(context, asyncio.get_running_loop())
+    logger.info("Step 2 - Data sources deferred until a rule reads them")
+
+    return await _run_pipeline_stage(
+        pool, ds_results, _chat_response, context, ds_results, rule_engine, message_resolver, message_format
+    )
+
 
+def _chat_response(
+    context: dict,
+    ds_results: dict,
+    rule_engine: RuleEngine,
+    message_resolver: MessageResolver,
+    message_format: MessageFormat,
+) -> ChatResponse:
+    """Steps 3 and 4 of the chat pipeline: evaluate rules and render the message."""
     # ─── Step 3: Evaluate rules (DETERMINISTIC — no AI here) ───
     match = rule_engine.evaluate(context, ds_results)
     logger.info(f"Step 3 - Rule match: {match}")
 
+    return _render_chat_response(match, context, ds_results, message_resolver, message_format)
+
+
+def _render_chat_response(
+    match: Optional[dict],
+    context: dict,
+    ds_results: dict,
+    message_resolver: MessageResolver,
+    message_format: MessageFormat,
+) -> ChatResponse:
+    """Step 4 of the chat pipeline: render the matched rule's message."""
     # ─── Step 4: Resolve message template ───
     if match:
         message_ref = match.get("message_ref", "")
-        resolved = message_resolver.resolve(message_ref, context, ds_results)
+        resolved = message_resolver.resolve(
+            message_ref, context, ds_results, render_html=message_format != "markdown"
+        )
 
         if resolved:
             return ChatResponse(
-                message=resolved["markdown"],
-                message_html=resolved["html"],
+                **_message_fields(resolved["markdown"], resolved["html"], message_format),
                 rule_matched=match["rule_id"],
                 rule_name=match["name"],
                 extracted_context=context,
@@ -75,11 +176,8 @@ def process_chat(
 
     # No match
     logger.info("No rule matched — returning fallback message")
-    import markdown as md
-
     return ChatResponse(
-        message=NO_MATCH_MESSAGE,
-        message_html=md.markdown(NO_MATCH_MESSAGE),
+        **_message_fields(NO_MATCH_MESSAGE, NO_MATCH_HTML, message_format),
         rule_matched=None,
         rule_name=None,
         extracted_context=context,
@@ -88,28 +186,165 @@ def process_chat(
     )
 
 
+async def stream_chat_events(
+    request: ChatRequest,
+    extractor: ContextExtractor,
+    rule_engine: RuleEngine,
+    message_resolver: MessageResolver,
+    data_resolver: AsyncDataSourceResolver,
+    message_format: Optional[MessageFormat] = None,
+    pool: Optional[WorkerPool] = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    process_chat_async as a sequence of (event, data) pairs, each yielded
+    as soon as its pipeline stage finishes:
+
+        extraction_token   {"text"}                  LLM output, as it streams
+        context            {"extracted_context"}
+        data_sources       {"data_sources_resolved"}  sources the rules read
+        rule               {"rule_matched", "rule_name", "confidence"}
+        message            {"markdown"}               one Markdown block at a time
+                           ({"html"}, whole, when only HTML was requested)
+        done               the complete ChatResponse
+    """
+    message_format = message_format or request.format or DEFAULT_FORMAT
+    logger.info(f"Streaming chat: {request.message[:100]}...")
+
+    # ─── Step 1: Extract structured context (LLM output streamed) ───
+    context: dict = {}
+    async for kind, value in extractor.extract_stream(request.message):
+        if kind == "token":
+            yield "extraction_token", {"text": value}
+        else:
+            context = value
+    yield "context", {"extracted_context": context}
+
+    # ─── Steps 2 and 3: Evaluate rules, fetching the data sources they read ───
+    ds_results = data_resolver.lazy(context, asyncio.get_running_loop())
+    match = await _run_pipeline_stage(pool, ds_results, rule_engine.evaluate, context, ds_results)
+    yield "data_sources", {"data_sources_resolved": {k: bool(v) for k, v in ds_results.items()}}
+    yield "rule", {
+        "rule_matched": match["rule_id"] if match else None,
+        "rule_name": match["name"] if match else None,
+        "confidence": "none" if not match else "high" if match.get("priority", 999) < 50 else "medium",
+    }
+
+    # ─── Step 4: Render, then stream the message block by block ───
+    response = await _run_pipeline_stage(
+        pool, ds_results, _render_chat_response, match, context, ds_results, message_resolver, message_format
+    )
+    if response.message is not None:
+        # Blocks keep their trailing blank line: joined, they are the whole message
+        for block in MESSAGE_BLOCK_SPLIT.split(response.message):
+            yield "message", {"markdown": block}
+    else:
+        yield "message", {"html": response.message_html}
+    yield "done", response.model_dump(exclude_unset=True)
+
+
 def process_evaluate(
     request: EvaluateRequest,
     rule_engine: RuleEngine,
     message_resolver: MessageResolver,
     data_resolver: DataSourceResolver,
+    message_format: Optional[MessageFormat] = None,
 ) -> ChatResponse:
     """
     Evaluate rules with explicit context (no AI extraction).
     Useful for testing and integration from other systems.
     """
     context = request.context
-    ds_results = data_resolver.resolve_all(context)
+    ds_results = data_resolver.lazy(context)
     match = rule_engine.evaluate(context, ds_results)
+    return _evaluation_response(
+        match, context, ds_results, message_resolver,
+        message_format or request.format or DEFAULT_FORMAT,
+    )
+
+
+async def process_evaluate_async(
+    request: EvaluateRequest,
+    rule_engine: RuleEngine,
+    message_resolver: MessageResolver,
+    data_resolver: AsyncDataSourceResolver,
+    message_format: Optional[MessageFormat] = None,
+    pool: Optional[WorkerPool] = None,
+) -> ChatResponse:
+    """
+    process_evaluate with data sources fetched lazily through
+    AsyncDataSourceResolver and evaluation + rendering run on pool.
+    """
+    context = request.context
+    ds_results = data_resolver.lazy(context, asyncio.get_running_loop())
+    message_format = message_format or request.format or DEFAULT_FORMAT
+
+    def respond():
+        match = rule_engine.evaluate(context, ds_results)
+        return _evaluation_response(match, context, ds_results, message_resolver, message_format)
+
+    return await _run_pipeline_stage(pool, ds_results, respond)
+
+
+async def _run_pipeline_stage(
+    pool: Optional[WorkerPool], ds_results: LazyDataSources, fn: Callable, *args
+):
+    """
+    Run the blocking/CPU part of a request, fn(*args), off the event loop:
+    on pool when given. Without a pool it runs inline, except when reading
+    ds_results may wait on an HTTP fetch scheduled on this event loop
+    (blocking on the loop itself would deadlock) — then in a worker thread.
+    """
+    if pool is not None:
+        return await pool.run(fn, *args)
+    if ds_results.blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+def process_evaluate_batch(
+    contexts: list[dict],
+    rule_engine: RuleEngine,
+    message_resolver: MessageResolver,
+    data_resolver: DataSourceResolver,
+    message_format: MessageFormat = DEFAULT_FORMAT,
+    ds_batch: Optional[list[dict]] = None,
+) -> list[ChatResponse]:
+    """
+    Evaluate rules for many explicit contexts in one pass.
+    Data sources, rule matches and messages are resolved for the whole batch;
+    responses are returned in input order. ds_batch passes in data sources
+    already resolved (e.g. by AsyncDataSourceResolver.resolve_many).
+    """
+    if ds_batch is None:
+        ds_batch = data_resolver.resolve_many(contexts)
+    matches = rule_engine.evaluate_many(contexts, ds_batch)
+    logger.info(
+        f"Batch evaluated {len(contexts)} contexts, "
+        f"{sum(1 for m in matches if m)} matched"
+    )
+    return [
+        _evaluation_response(match, context, ds_results, message_resolver, message_format)
+        for match, context, ds_results in zip(matches, contexts, ds_batch)
+    ]
+
 
+def _evaluation_response(
+    match: Optional[dict],
+    context: dict,
+    ds_results: dict,
+    message_resolver: MessageResolver,
+    message_format: MessageFormat = DEFAULT_FORMAT,
+) -> ChatResponse:
+    """Render the response for an explicit-context evaluation."""
     if match:
         message_ref = match.get("message_ref", "")
-        resolved = message_resolver.resolve(message_ref, context, ds_results)
+        resolved = message_resolver.resolve(
+            message_ref, context, ds_results, render_html=message_format != "markdown"
+        )
 
         if resolved:
             return ChatResponse(
-                message=resolved["markdown"],
-                message_html=resolved["html"],
+                **_message_fields(resolved["markdown"], resolved["html"], message_format),
                 rule_matched=match["rule_id"],
                 rule_name=match["name"],
                 extracted_context=context,
@@ -117,11 +352,8 @@ def process_evaluate(
                 confidence="high",
             )
 
-    import markdown as md
-
     return ChatResponse(
-        message=NO_MATCH_MESSAGE,
-        message_html=md.markdown(NO_MATCH_MESSAGE),
+        **_message_fields(NO_MATCH_MESSAGE, NO_MATCH_HTML, message_format),
         rule_matched=None,
         rule_name=None,
         extracted_context=context,
@@ -5,27 +5,38 @@ Main entry point. Run with:
     uvicorn api.main:app --reload --port 8000
 """
 
+import asyncio
+import json
 import logging
 import os
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from pydantic import ValidationError
+
 from api.models import (
-    ChatRequest, ChatResponse, EvaluateRequest,
-    HealthResponse, RuleSummary,
+    BatchEvaluateRequest, BatchEvaluateResponse, ChatRequest, ChatResponse,
+    EvaluateRequest, HealthResponse, MessageFormat, RuleSummary,
+)
+from api.chat import (
+    negotiate_format, process_chat_async, process_evaluate_async, process_evaluate_batch,
+    stream_chat_events,
 )
-from api.chat import process_chat, process_evaluate
 from api import admin as admin_module
 from engine.rule_engine import RuleEngine
 from engine.message_resolver import MessageResolver
+from engine.cache import PersistentCache
 from engine.context_extractor import ContextExtractor
-from engine.data_sources import DataSourceResolver
+from engine.data_sources import AsyncDataSourceResolver, DataSourceResolver
 from engine.bitbucket_client import BitbucketClient
+from engine.file_watcher import FileWatcher
+from engine.worker_pool import WorkerPool
 
 # ─── Load environment variables ───
 load_dotenv()
@@ -44,18 +55,68 @@ RULES_PATH = BASE_DIR / "rules" / "ga_rules.json"
 MESSAGES_DIR = BASE_DIR / "messages"
 STATIC_DIR = BASE_DIR / "static"
 
+# ─── Batch evaluation ───
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "500"))
+
+# ─── File watching (auto-reload on edits; each worker polls on its own) ───
+WATCH_FILES = os.getenv("WATCH_FILES", "false").lower() == "true"
+WATCH_INTERVAL_SECONDS = float(os.getenv("WATCH_INTERVAL_SECONDS", "0.5"))
+
+# ─── Pipeline worker threads (rule evaluation + rendering off the event loop; 0 = inline) ───
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "8"))
+
+# ─── LLM extraction (hedge calls slower than this latency percentile; unset = off) ───
+OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE") or 0) or None
+
 # ─── Initialize components ───
 logger.info(f"Base directory: {BASE_DIR}")
 logger.info(f"Rules path: {RULES_PATH}")
 logger.info(f"Messages dir: {MESSAGES_DIR}")
 
-rule_engine = RuleEngine(str(RULES_PATH))
-message_resolver = MessageResolver(str(MESSAGES_DIR))
+rule_engine = RuleEngine(
+    str(RULES_PATH),
+    cache_size=int(os.getenv("RULE_CACHE_SIZE", "4096")),
+)
+message_resolver = MessageResolver(
+    str(MESSAGES_DIR),
+    html_cache_size=int(os.getenv("MESSAGE_HTML_CACHE_SIZE", "1024")),
+)
 context_extractor = ContextExtractor(
     api_key=os.getenv("OPENAI_API_KEY"),
     model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+    cache=PersistentCache(
+        maxsize=int(os.getenv("EXTRACTION_CACHE_SIZE", "2048")),
+        path=os.getenv("EXTRACTION_CACHE_PATH") or None,
+    ),
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "15")),
+    hedge_percentile=OPENAI_HEDGE_PERCENTILE,
 )
 data_resolver = DataSourceResolver(mode="mock")
+pipeline_pool = WorkerPool(PIPELINE_WORKERS) if PIPELINE_WORKERS > 0 else None
+
+# ─── Async data sources (concurrent lookups; DATA_SOURCE_MODE=http calls the APIs) ───
+DATA_SOURCE_ENV = {
+    "fehbp_address": "FEHBP_API",
+    "group_details": "GROUP_DETAILS_API",
+    "account_type": "ACCOUNT_TYPE_API",
+}
+async_data_resolver = AsyncDataSourceResolver(
+    mode=os.getenv("DATA_SOURCE_MODE", "mock"),
+    endpoints={
+        name: os.getenv(f"{prefix}_URL")
+        for name, prefix in DATA_SOURCE_ENV.items() if os.getenv(f"{prefix}_URL")
+    },
+    timeouts={
+        name: float(os.getenv(f"{prefix}_TIMEOUT_SECONDS"))
+        for name, prefix in DATA_SOURCE_ENV.items() if os.getenv(f"{prefix}_TIMEOUT_SECONDS")
+    },
+    default_timeout=float(os.getenv("DATA_SOURCE_TIMEOUT_SECONDS", "2.0")),
+    data_sources=lambda: rule_engine.data_sources,
+    cache_size=int(os.getenv("DATA_SOURCE_CACHE_SIZE", "10000")),
+)
 
 # ─── Bitbucket Client ───
 bb_client = BitbucketClient(
@@ -69,6 +130,25 @@ bb_client = BitbucketClient(
 # ─── Initialize Admin Module ───
 admin_module.init(bb_client, rule_engine, message_resolver)
 
+
+# ─── File Watcher ───
+def _on_rules_changed(path: Path, deleted: bool):
+    if deleted:
+        logger.warning(f"Rules file removed: {path} — keeping the loaded rules")
+        return
+    rule_engine.reload()
+
+
+def _on_message_changed(path: Path, deleted: bool):
+    message_resolver.reload_file(path)
+
+
+file_watcher = None
+if WATCH_FILES:
+    file_watcher = FileWatcher(interval=WATCH_INTERVAL_SECONDS)
+    file_watcher.watch(RULES_PATH, _on_rules_changed)
+    file_watcher.watch(MESSAGES_DIR, _on_message_changed, pattern="*.md")
+
 # ─── FastAPI App ───
 app = FastAPI(
     title="G&A Rules Engine",
@@ -117,8 +197,8 @@ async def admin_page():
     return HTMLResponse(content="<h1>Admin page not found</h1>")
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+@app.post("/api/chat", response_model=ChatResponse, response_model_exclude_unset=True)
+async def chat(request: ChatRequest, accept: Optional[str] = Header(default=None)):
     """
     🗣️ Chat endpoint — Send a natural language question about G&A.
 
@@ -128,22 +208,66 @@ async def chat(request: ChatRequest):
     3. Matching message template is rendered with real values
 
     **Example**: "I'm a member in Virginia with an FEHBP account and want to file a grievance"
+
+    Send `"format": "markdown"` (or `Accept: text/markdown`) to skip HTML rendering.
     """
     try:
-        return process_chat(
+        return await process_chat_async(
             request=request,
             extractor=context_extractor,
             rule_engine=rule_engine,
             message_resolver=message_resolver,
-            data_resolver=data_resolver,
+            data_resolver=async_data_resolver,
+            message_format=negotiate_format(request.format, accept),
+            pool=pipeline_pool,
         )
     except Exception as e:
         logger.exception(f"Chat processing error: {e}")
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
 
-@app.post("/api/evaluate", response_model=ChatResponse)
-async def evaluate(request: EvaluateRequest):
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, accept: Optional[str] = Header(default=None)):
+    """
+    📡 Streaming chat — the /api/chat pipeline as Server-Sent Events.
+
+    Each stage is sent as soon as it completes: `extraction_token` (LLM
+    output as it streams), `context`, `data_sources`, `rule`, `message`
+    (one Markdown block per event) and finally `done` with the full
+    ChatResponse. A failure mid-stream is sent as an `error` event.
+    """
+    message_format = negotiate_format(request.format, accept)
+
+    async def events():
+        try:
+            async for event, data in stream_chat_events(
+                request=request,
+                extractor=context_extractor,
+                rule_engine=rule_engine,
+                message_resolver=message_resolver,
+                data_resolver=async_data_resolver,
+                message_format=message_format,
+                pool=pipeline_pool,
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            logger.exception(f"Chat stream error: {e}")
+            yield _sse("error", {"detail": f"Processing error: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event (JSON data on a single line)."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/evaluate", response_model=ChatResponse, response_model_exclude_unset=True)
+async def evaluate(request: EvaluateRequest, accept: Optional[str] = Header(default=None)):
     """
     🔧 Direct evaluation — Pass explicit context (no AI extraction).
 
@@ -164,19 +288,142 @@ async def evaluate(request: EvaluateRequest):
         }
     }
     ```
+
+    Send `"format": "markdown"` (or `Accept: text/markdown`) to skip HTML rendering.
     """
     try:
-        return process_evaluate(
+        return await process_evaluate_async(
             request=request,
             rule_engine=rule_engine,
             message_resolver=message_resolver,
-            data_resolver=data_resolver,
+            data_resolver=async_data_resolver,
+            message_format=negotiate_format(request.format, accept),
+            pool=pipeline_pool,
         )
     except Exception as e:
         logger.exception(f"Evaluation error: {e}")
         raise HTTPException(status_code=500, detail=f"Evaluation error: {str(e)}")
 
 
+@app.post(
+    "/api/evaluate/batch",
+    response_model=BatchEvaluateResponse,
+    response_model_exclude_unset=True,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": BatchEvaluateRequest.model_json_schema()},
+                NDJSON_MEDIA_TYPE: {"schema": {"type": "string", "description": "One context object per line"}},
+            },
+        }
+    },
+)
+async def evaluate_batch(
+    request: Request,
+    format: Optional[MessageFormat] = Query(default=None, description="markdown, html or both (NDJSON input)"),
+):
+    """
+    📦 Batch evaluation — Evaluate many explicit contexts in one request.
+
+    **Input**: `{"contexts": [{...}, {...}]}` as JSON, or one context object
+    per line with `Content-Type: application/x-ndjson`.
+
+    **Output**: a `BatchEvaluateResponse` JSON document, or one `ChatResponse`
+    per line (streamed as each chunk is evaluated) when the request sends
+    `Accept: application/x-ndjson`.
+
+    `format` (body field, or query parameter) selects markdown, html or both.
+    """
+    contexts, requested_format = _parse_batch_contexts(
+        await request.body(), request.headers.get("content-type", "")
+    )
+    accept = request.headers.get("accept", "")
+    message_format = negotiate_format(requested_format or format, accept)
+
+    if NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(_stream_batch(contexts, message_format), media_type=NDJSON_MEDIA_TYPE)
+
+    try:
+        results = await _run_blocking(
+            process_evaluate_batch,
+            contexts=contexts,
+            rule_engine=rule_engine,
+            message_resolver=message_resolver,
+            data_resolver=data_resolver,
+            message_format=message_format,
+            ds_batch=await async_data_resolver.resolve_many(contexts),
+        )
+    except Exception as e:
+        logger.exception(f"Batch evaluation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Evaluation error: {str(e)}")
+
+    return BatchEvaluateResponse(
+        results=results,
+        total=len(results),
+        matched=sum(1 for r in results if r.rule_matched),
+    )
+
+
+def _parse_batch_contexts(body: bytes, content_type: str) -> tuple[list[dict], Optional[str]]:
+    """Read batch contexts (and the JSON body's format, if any) from a JSON or NDJSON request body."""
+    if NDJSON_MEDIA_TYPE in content_type:
+        contexts = []
+        for line_no, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                context = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise HTTPException(status_code=422, detail=f"Line {line_no}: invalid JSON: {e}")
+            if not isinstance(context, dict):
+                raise HTTPException(status_code=422, detail=f"Line {line_no}: context must be an object")
+            contexts.append(context)
+        return contexts, None
+
+    try:
+        batch = BatchEvaluateRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_input=False))
+    return batch.contexts, batch.format
+
+
+async def _stream_batch(contexts: list[dict], message_format: str):
+    """Yield NDJSON response lines, evaluating BATCH_CHUNK_SIZE contexts at a time."""
+    for start in range(0, len(contexts), BATCH_CHUNK_SIZE):
+        chunk = contexts[start:start + BATCH_CHUNK_SIZE]
+        results = await _run_blocking(
+            process_evaluate_batch,
+            contexts=chunk,
+            rule_engine=rule_engine,
+            message_resolver=message_resolver,
+            data_resolver=data_resolver,
+            message_format=message_format,
+            ds_batch=await async_data_resolver.resolve_many(chunk),
+        )
+        yield "".join(r.model_dump_json(exclude_unset=True) + "\n" for r in results)
+
+
+async def _run_blocking(fn, *args, **kwargs):
+    """Run fn on the pipeline pool (inline when PIPELINE_WORKERS=0)."""
+    if pipeline_pool is None:
+        return fn(*args, **kwargs)
+    return await pipeline_pool.run(fn, *args, **kwargs)
+
+
+# ─── Mock data source backends (local stand-ins for the FEHBP / Apex / AccountType APIs) ───
+MOCK_SOURCES = {"fehbp": "fehbp_address", "group-details": "group_details", "account-type": "account_type"}
+
+
+@app.post("/mock/{source}")
+async def mock_data_source(source: str, request: Request):
+    """🧪 Mock data source API — POST a member context, get the source's data back."""
+    name = MOCK_SOURCES.get(source)
+    if name is None:
+        raise HTTPException(status_code=404, detail=f"Unknown mock data source: {source}")
+    return data_resolver.resolve_source(name, await request.json())
+
+
 @app.get("/api/rules", response_model=list[RuleSummary])
 async def list_rules():
     """📋 List all active rules with metadata."""
@@ -195,8 +442,8 @@ async def get_rule(rule_id: str):
 @app.post("/api/reload")
 async def reload_rules():
     """🔄 Hot-reload rules and messages from disk (no restart needed)."""
-    rule_engine.reload()
-    message_resolver.reload()
+    await asyncio.to_thread(rule_engine.reload)
+    await asyncio.to_thread(message_resolver.reload)
     return {
         "status": "reloaded",
         "rules_count": len(rule_engine.rules),
@@ -212,6 +459,14 @@ async def health():
         rules_loaded=len(rule_engine.rules),
         messages_loaded=len(message_resolver.cache),
         openai_configured=context_extractor.client is not None,
+        caches={
+            "rules": rule_engine.cache_stats(),
+            "message_html": message_resolver.html_cache.stats(),
+            "data_sources": async_data_resolver.cache.stats(),
+            "extraction": context_extractor.cache.stats(),
+        },
+        extraction_tiers=context_extractor.stats(),
+        worker_pool=pipeline_pool.stats() if pipeline_pool else {},
     )
 
 
@@ -224,8 +479,23 @@ async def startup():
     logger.info(f"  Messages loaded: {len(message_resolver.cache)}")
     logger.info(f"  OpenAI configured: {context_extractor.client is not None}")
     logger.info(f"  Bitbucket configured: {bb_client.configured}")
-    logger.info(f"  Mode: {data_resolver.mode}")
+    logger.info(f"  Mode: {async_data_resolver.mode}")
+    logger.info(f"  File watcher: {'on' if file_watcher else 'off'}")
+    logger.info(f"  Pipeline workers: {PIPELINE_WORKERS or 'inline'}")
     logger.info(f"  Chat UI:  http://localhost:8000/")
     logger.info(f"  Admin UI: http://localhost:8000/admin")
     logger.info(f"  API Docs: http://localhost:8000/docs")
     logger.info("=" * 60)
+    if file_watcher:
+        file_watcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if file_watcher:
+        file_watcher.stop()
+    await async_data_resolver.aclose()
+    await context_extractor.aclose()
+    if pipeline_pool:
+        pipeline_pool.shutdown()
+    context_extractor.cache.close()
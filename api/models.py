@@ -1,8 +1,16 @@
 """Pydantic models for API request/response schemas."""
 
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel, Field
 
+# Which message renderings a response carries. "markdown" skips HTML conversion.
+MessageFormat = Literal["markdown", "html", "both"]
+
+FORMAT_DESCRIPTION = (
+    "Message renderings to return: markdown, html or both. "
+    "Defaults to the Accept header (text/markdown or text/html), else both."
+)
+
 
 class ChatRequest(BaseModel):
     """User sends a natural language question about G&A."""
@@ -19,12 +27,16 @@ class ChatRequest(BaseModel):
         default=None,
         description="Optional session ID for conversation tracking",
     )
+    format: Optional[MessageFormat] = Field(default=None, description=FORMAT_DESCRIPTION)
 
 
 class ChatResponse(BaseModel):
-    """Response with matched rule and rendered message."""
-    message: str = Field(description="Human-readable response message (Markdown)")
-    message_html: str = Field(description="HTML-rendered message")
+    """
+    Response with matched rule and rendered message.
+    message / message_html are left out when the requested format excludes them.
+    """
+    message: Optional[str] = Field(default=None, description="Human-readable response message (Markdown)")
+    message_html: Optional[str] = Field(default=None, description="HTML-rendered message")
     rule_matched: Optional[str] = Field(description="ID of the matched rule")
     rule_name: Optional[str] = Field(description="Name of the matched rule")
     extracted_context: dict = Field(description="Context extracted from user's question")
@@ -45,6 +57,28 @@ class EvaluateRequest(BaseModel):
             "IsASO": False,
         }]},
     )
+    format: Optional[MessageFormat] = Field(default=None, description=FORMAT_DESCRIPTION)
+
+
+class BatchEvaluateRequest(BaseModel):
+    """Evaluate rules for many explicit contexts in one request."""
+    contexts: list[dict] = Field(
+        ...,
+        description="Member context dicts, evaluated independently",
+        max_length=10000,
+        json_schema_extra={"examples": [[
+            {"HCCustomerType": "Member", "Policy.PolicyState": "VA", "account_type": "FEHBP"},
+            {"HCCustomerType": "Broker", "Policy.PolicyState": "TX", "account_type": "National"},
+        ]]},
+    )
+    format: Optional[MessageFormat] = Field(default=None, description=FORMAT_DESCRIPTION)
+
+
+class BatchEvaluateResponse(BaseModel):
+    """Batch evaluation results, in the same order as the request contexts."""
+    results: list[ChatResponse]
+    total: int = Field(description="Number of contexts evaluated")
+    matched: int = Field(description="Number of contexts that matched a rule")
 
 
 class RuleSummary(BaseModel):
@@ -63,3 +97,6 @@ class HealthResponse(BaseModel):
     rules_loaded: int
     messages_loaded: int
     openai_configured: bool
+    caches: dict = Field(default_factory=dict, description="Hit/miss counters per cache")
+    extraction_tiers: dict = Field(default_factory=dict, description="Extractions answered per tier")
+    worker_pool: dict = Field(default_factory=dict, description="Pipeline pool saturation counters")
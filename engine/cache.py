@@ -0,0 +1,250 @@
+"""
+Caches
+======
+Small in-process caches shared by the engine components.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe, size-bounded least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value (marking it recently used) or default."""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, predicate) -> int:
+        """Drop every entry whose key satisfies predicate(key). Returns the count."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Counters for health/metrics endpoints."""
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class LoadCancelled(Exception):
+    """The shared load a caller was waiting on was cancelled (e.g. timed out)."""
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after a per-entry
+    TTL, with single-flight loading: concurrent get_or_load() calls for the
+    same missing key share one load instead of each hitting the backend.
+    """
+
+    def __init__(self, maxsize: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()  # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached, unexpired value (marking it recently used) or default."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any, ttl: float):
+        """Store a value for ttl seconds, evicting the least recently used entry when full."""
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        ttl: Callable[[Any], float],
+    ) -> Any:
+        """
+        Cached value for key, or the result of load() — awaited once however
+        many callers ask concurrently. ttl(value) gives the value's lifetime
+        (0 = don't cache). A failed load is not cached; its error is raised to
+        every waiting caller.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            future.set_exception(LoadCancelled(f"Load cancelled for {key!r}"))
+            future.exception()  # Mark retrieved when nobody else was waiting
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self.put(key, value, ttl(value))
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Counters for health/metrics endpoints."""
+        return {
+            "size": len(self._data), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+        }
+
+
+class PersistentCache:
+    """
+    String-keyed cache of JSON-serializable values: an in-memory LRU in front
+    of an optional SQLite file, so entries survive restarts and are shared
+    by workers on the same host.
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None):
+        """
+        Args:
+            maxsize: In-memory LRU entries.
+            path: SQLite database file (created if missing); None = memory only.
+        """
+        self.memory = LRUCache(maxsize)
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value (memory first, then disk) or default."""
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Persistent cache read failed: {e}")
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                self.memory.put(key, value)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return default
+
+    def put(self, key: str, value: Any):
+        self.memory.put(key, value)
+        if self._db is None:
+            return
+        try:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Persistent cache write failed: {e}")
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        """Counters for health/metrics endpoints."""
+        return {
+            "size": len(self.memory), "maxsize": self.memory.maxsize,
+            "memory_hits": self.memory.hits, "disk_hits": self.disk_hits,
+            "hits": self.memory.hits + self.disk_hits, "misses": self.misses,
+            "persistent": self.path is not None,
+        }
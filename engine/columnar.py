@@ -0,0 +1,336 @@
+"""
+Columnar Rule Evaluator
+=======================
+Evaluates the rule set over a whole book of members at once, for offline
+re-scoring ("which message would every member get under the new rules?").
+
+Contexts are given as columns — one sequence per context key (lists, or
+NumPy arrays / pandas Series via .tolist()) — instead of one dict per member.
+Every condition becomes a row mask, and all/any/not combine masks, so each
+leaf is computed once per DISTINCT value in its column rather than once
+per member.
+
+Masks are Python ints used as bitsets (bit i = row i). Every node yields
+(true_mask, error_mask) so that rows whose evaluation would raise are
+skipped exactly like RuleEngine.evaluate() skips a rule on error.
+Results are identical to calling RuleEngine.evaluate() row by row.
+"""
+
+import logging
+from typing import Any, Callable, Mapping, Optional, Sequence
+
+from .rule_engine import _source_signature
+
+logger = logging.getLogger(__name__)
+
+# Row value for lookups that raised (e.g. a data source row that isn't a dict)
+_ERROR = object()
+
+
+class ColumnarEvaluator:
+    """Evaluate a rule snapshot over column-oriented batches of contexts."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def evaluate(
+        self,
+        columns: Mapping[str, Sequence],
+        ds_columns: Optional[Mapping[str, Sequence[dict]]] = None,
+    ) -> list[Optional[str]]:
+        """
+        Return the matching rule_id (sub-rule id when a sub-rule matched)
+        or None for every row.
+
+        Args:
+            columns: {context_key: values}, e.g.
+                {"HCCustomerType": [...], "Policy.PolicyState": [...]}.
+                Row i behaves like the context {key: values[i] for each key}.
+            ds_columns: {source_name: [per-row data source dict, ...]}.
+                Sources not given are treated as {} for every row.
+        """
+        batch = _Batch(self.snapshot, columns, ds_columns or {})
+        result: list[Optional[str]] = [None] * batch.size
+        remaining = batch.full
+
+        for rule in self.snapshot.rules:
+            if not remaining:
+                break
+            rule_id = rule.get("id", "unknown")
+            true, error = batch.block(rule.get("conditions", {}))
+            matched = true & ~error & remaining
+
+            for sub in rule.get("sub_rules", []):
+                if not matched:
+                    break
+                sub_true, sub_error = batch.block(sub.get("conditions", {}))
+                # A failing sub-rule skips the whole rule for that row
+                matched &= ~sub_error
+                hit = matched & sub_true
+                if hit:
+                    _assign(result, hit, sub.get("id", rule_id))
+                    remaining &= ~hit
+                    matched &= ~hit
+
+            if matched:
+                _assign(result, matched, rule_id)
+                remaining &= ~matched
+
+        return result
+
+
+class _Batch:
+    """Per-call state: the columns plus masks memoized by field and template."""
+
+    def __init__(self, snapshot, columns: Mapping[str, Sequence], ds_columns: Mapping[str, Sequence]):
+        self.snapshot = snapshot
+        self.columns = {k: _as_list(v) for k, v in columns.items()}
+        self.ds_columns = {k: _as_list(v) for k, v in ds_columns.items()}
+
+        sizes = {len(v) for v in self.columns.values()} | {len(v) for v in self.ds_columns.values()}
+        if len(sizes) > 1:
+            raise ValueError(f"All columns must have the same length, got {sorted(sizes)}")
+        self.size = sizes.pop() if sizes else 0
+        self.full = (1 << self.size) - 1
+
+        self._field_groups: dict[tuple, _Groups] = {}
+        self._templates: dict[str, tuple[int, int]] = {}
+        self._stack: list[str] = []
+
+    # ─── Condition blocks ───
+
+    def block(self, block: dict) -> tuple[int, int]:
+        """Evaluate a condition block into (true_mask, error_mask)."""
+        try:
+            return self._block(block)
+        except RecursionError:
+            raise
+        except Exception as e:
+            # Malformed rule JSON: evaluate() would raise for every row
+            logger.warning(f"Error evaluating block in columnar mode: {e}")
+            return 0, self.full
+
+    def _block(self, block: dict) -> tuple[int, int]:
+        if "use_template" in block:
+            name = block["use_template"]
+            if name in self._templates:
+                return self._templates[name]
+            template = self.snapshot.templates.get(name)
+            if template is None:
+                return 0, 0
+            if name in self._stack:
+                return 0, self.full  # Cyclic reference raises in evaluate()
+            self._stack.append(name)
+            try:
+                masks = self._block(template)
+            finally:
+                self._stack.pop()
+            self._templates[name] = masks
+            return masks
+
+        if "all" in block:
+            live, error = self.full, 0
+            for child in block["all"]:
+                true, child_error = self._block(child)
+                error |= live & child_error
+                live &= true & ~child_error
+            return live, error
+
+        if "any" in block:
+            live, true, error = self.full, 0, 0
+            for child in block["any"]:
+                child_true, child_error = self._block(child)
+                error |= live & child_error
+                true |= live & child_true & ~child_error
+                live &= ~child_true & ~child_error
+            return true, error
+
+        if "not" in block:
+            true, error = self._block(block["not"])
+            return self.full & ~true & ~error, error
+
+        return self._condition(block)
+
+    def _condition(self, cond: dict) -> tuple[int, int]:
+        op = cond.get("op", "eq")
+
+        if "source" in cond and "field" not in cond:
+            # Whole-source checks: evaluate once per distinct emptiness signature
+            predicate = self.snapshot._compile_condition(cond)
+            source_name = cond["source"]
+            rows = self.ds_columns.get(source_name)
+            if rows is None:
+                return (self.full if predicate(None, {}, None) else 0), 0
+            return _apply(lambda v: predicate(None, {source_name: v}, None), self._source_groups(source_name))
+
+        test = self.snapshot._compile_compare(cond.get("val"), op)
+        if "source" in cond:
+            groups = self._groups(("source", cond["source"], cond["field"]))
+        else:
+            groups = self._groups(("field", cond.get("field", "")))
+        return _apply(test, groups)
+
+    # ─── Column resolution ───
+
+    def _groups(self, key: tuple) -> "_Groups":
+        """Distinct values of a field and each row's group (memoized per field)."""
+        groups = self._field_groups.get(key)
+        if groups is None:
+            if key[0] == "source":
+                values = self._source_field_column(key[1], key[2])
+            else:
+                values = self._field_column(key[1])
+            groups = self._field_groups[key] = _factorize(values, self.size)
+        return groups
+
+    def _source_groups(self, source_name: str) -> "_Groups":
+        """Source rows grouped by what whole-source checks observe (memoized per source)."""
+        key = ("source", source_name)
+        groups = self._field_groups.get(key)
+        if groups is None:
+            groups = self._field_groups[key] = _factorize_by_signature(
+                self.ds_columns[source_name], _source_signature(source_name), source_name
+            )
+        return groups
+
+    def _field_column(self, field: str):
+        """Column for a field with _get_field() semantics (flat, nested, last segment)."""
+        columns = self.columns
+        if field in columns:
+            return columns[field]
+
+        parts = field.split(".")
+        fallback = columns.get(parts[-1])
+        root = columns.get(parts[0])
+        if root is None:
+            return fallback  # None → every row is None
+
+        values = []
+        for i, current in enumerate(root):
+            for part in parts[1:]:
+                if isinstance(current, dict) and part in current:
+                    current = current[part]
+                else:
+                    current = fallback[i] if fallback is not None else None
+                    break
+            values.append(current)
+        return values
+
+    def _source_field_column(self, source_name: str, field: str):
+        rows = self.ds_columns.get(source_name)
+        if rows is None:
+            return None
+        values = []
+        for row in rows:
+            try:
+                values.append(row.get(field))
+            except Exception:
+                values.append(_ERROR)
+        return values
+
+
+def _as_list(values) -> list:
+    """Materialize a column; NumPy arrays / pandas Series become native Python values."""
+    if hasattr(values, "tolist"):
+        return values.tolist()
+    return list(values)
+
+
+class _Groups:
+    """A factorized column: distinct values plus each row's group number (reversed)."""
+
+    __slots__ = ("values", "codes_reversed", "full")
+
+    def __init__(self, values: list, codes_reversed: list):
+        self.values = values
+        self.codes_reversed = codes_reversed
+        self.full = (1 << len(codes_reversed)) - 1
+
+    def mask(self, bits: list) -> int:
+        """Row mask from a per-group '0'/'1' list — one C-level join + int(..., 2)."""
+        if "1" not in bits:
+            return 0
+        if "0" not in bits:
+            return self.full
+        return int("".join(map(bits.__getitem__, self.codes_reversed)), 2)
+
+
+def _factorize(values: Optional[list], size: int) -> _Groups:
+    """Group rows by value (type-exact). None means every row is None."""
+    if values is None:
+        return _Groups([None], [0] * size)
+
+    index: dict[Any, int] = {}
+    try:
+        codes = [index.setdefault((v.__class__, v), len(index)) for v in values]
+        codes.reverse()
+        return _Groups([key[1] for key in index], codes)
+    except TypeError:
+        pass  # Some values are unhashable — fall back to the row-by-row loop
+
+    index = {}
+    distinct: list = []
+    codes = []
+    for value in values:
+        try:
+            key = (value.__class__, value)
+            code = index.get(key)
+        except TypeError:
+            key, code = None, None  # Unhashable — its own group
+        if code is None:
+            code = len(distinct)
+            distinct.append(value)
+            if key is not None:
+                index[key] = code
+        codes.append(code)
+    codes.reverse()
+    return _Groups(distinct, codes)
+
+
+def _factorize_by_signature(rows: list, signature: Callable, source_name: str) -> _Groups:
+    """
+    Group data source rows by signature(row) — equal signatures give equal
+    whole-source check results, so fresh-but-equal dicts share a group.
+    Rows the signature can't read (not a dict) stay in their own group.
+    """
+    index: dict[Any, int] = {}
+    distinct: list = []
+    codes = []
+    for value in rows:
+        try:
+            key = signature(None, {source_name: value})
+        except Exception:
+            key = ("row", id(value))
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(distinct)
+            distinct.append(value)
+        codes.append(code)
+    codes.reverse()
+    return _Groups(distinct, codes)
+
+
+def _apply(test: Callable[[Any], bool], groups: _Groups) -> tuple[int, int]:
+    """Run a leaf test once per distinct value and expand the outcome to row masks."""
+    true_bits, error_bits = [], []
+    for value in groups.values:
+        if value is _ERROR:
+            true_bits.append("0")
+            error_bits.append("1")
+            continue
+        try:
+            true_bits.append("1" if test(value) else "0")
+            error_bits.append("0")
+        except Exception:
+            true_bits.append("0")
+            error_bits.append("1")
+    return groups.mask(true_bits), groups.mask(error_bits)
+
+
+def _assign(result: list, mask: int, rule_id: str):
+    """Write rule_id into every row set in mask."""
+    bits = bin(mask)[:1:-1]  # Row 0 first
+    row = bits.find("1")
+    while row != -1:
+        result[row] = rule_id
+        row = bits.find("1", row + 1)
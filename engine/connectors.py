@@ -0,0 +1,384 @@
+"""
+Data Source Connectors
+======================
+Generic HTTP connectors built from the `data_sources` block of ga_rules.json,
+so a new data source needs configuration only, no code:
+
+    "group_details": {
+        "api": {
+            "method": "POST",
+            "endpoint": "https://.../v2/group/details",
+            "headers": {"apikey": "${env.APEX_API_KEY}"},
+            "retries": 2,                 # optional, default 2
+            "backoff_seconds": 0.1,       # optional, doubles per retry
+            "circuit_breaker": {"failure_threshold": 5, "reset_seconds": 30},
+            "batch": {                    # optional
+                "batch_endpoint": "https://.../v2/group/details/batch",  # optional
+                "window_ms": 5, "max_batch": 50, "max_concurrency": 8
+            }
+        },
+        "lookup": {"GroupID": "Policy.GroupNumber", ...},
+        "cache": {"ttl_seconds": 600, "negative_ttl_seconds": 60}  # optional
+    }
+
+The request carries each lookup parameter's value from the member context
+(JSON body for POST/PUT, query string otherwise). Requests go through the
+caller's pooled httpx.AsyncClient, so connections (and TLS sessions) are
+kept alive across requests. Transient failures are retried with backoff,
+and a circuit breaker stops calling a backend that keeps failing.
+
+With a "cache" block, responses are cached per lookup-parameter values
+(empty responses for negative_ttl_seconds), and concurrent identical
+lookups share a single backend call.
+
+With a "batch" block in "api", lookups arriving within window_ms are collected by a
+MicroBatcher and sent together: as one POST to batch_endpoint when the
+backend has a batch API ({"requests": [params, ...]} → {"results": [...]},
+in order), otherwise as a fan-out of distinct lookups capped at
+max_concurrency connections.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+ENV_PATTERN = re.compile(r"\$\{env\.([A-Za-z_][A-Za-z0-9_]*)\}")
+
+RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """The backend failed repeatedly; calls are short-circuited for a while."""
+
+
+class CircuitBreaker:
+    """
+    Closed → open after failure_threshold consecutive failures; after
+    reset_seconds one trial call is let through (half-open), which closes
+    the circuit on success or re-opens it on failure.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go through now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+        self._trial_in_flight = False
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within a short window (or until max_batch are
+    waiting) and hands them to run_batch(items) in one call; each submitter
+    gets its own element of the returned list (an Exception element is
+    raised to that submitter only).
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list], Awaitable[list]],
+        window_ms: float = 5.0,
+        max_batch: int = 50,
+    ):
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)  # Keep a reference until it finishes
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # Submitter gave up (timeout)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class HttpConnector:
+    """Calls one configured data source API."""
+
+    def __init__(
+        self,
+        name: str,
+        config: dict,
+        client: Callable[[], httpx.AsyncClient],
+        cache: Optional[TTLCache] = None,
+    ):
+        """
+        Args:
+            name: Data source name (key in the data_sources block).
+            config: That source's block (needs api.endpoint).
+            client: Returns the shared pooled AsyncClient.
+            cache: Shared response cache, used when the block has "cache".
+        """
+        api = config["api"]
+        self.name = name
+        self.method = api.get("method", "GET").upper()
+        self.endpoint = expand_env(api["endpoint"])
+        self.headers = {k: expand_env(str(v)) for k, v in api.get("headers", {}).items()}
+        self.lookup = config.get("lookup", {})
+        # Same path resolution as rule conditions (imported here: rule_engine
+        # imports data_sources, which imports this module)
+        from .rule_engine import _field_accessor
+        self._lookup_fields = tuple(
+            (param, _field_accessor(field)) for param, field in self.lookup.items()
+        )
+        self.retries = int(api.get("retries", 2))
+        self.backoff_seconds = float(api.get("backoff_seconds", 0.1))
+        breaker = api.get("circuit_breaker", {})
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(breaker.get("failure_threshold", 5)),
+            reset_seconds=float(breaker.get("reset_seconds", 30.0)),
+        )
+        caching = config.get("cache", {})
+        self.ttl_seconds = float(caching.get("ttl_seconds", 0))
+        self.negative_ttl_seconds = float(caching.get("negative_ttl_seconds", 0))
+        self._cache = cache if self.ttl_seconds > 0 or self.negative_ttl_seconds > 0 else None
+        self._client = client
+
+        batching = api.get("batch")
+        if "batch" in config:
+            logger.warning(f'Data source {name}: "batch" belongs under "api" — ignored')
+        self._batcher = None
+        self.batch_endpoint = None
+        if isinstance(batching, dict):
+            self.batch_endpoint = expand_env(batching["batch_endpoint"]) if batching.get("batch_endpoint") else None
+            self._fan_out = asyncio.Semaphore(int(batching.get("max_concurrency", 8)))
+            self._batcher = MicroBatcher(
+                self._call_batch,
+                window_ms=float(batching.get("window_ms", 5)),
+                max_batch=int(batching.get("max_batch", 50)),
+            )
+
+    def lookup_params(self, context: dict) -> dict:
+        """Map lookup parameters to their context values (missing ones left out)."""
+        params = {}
+        for param, get_field in self._lookup_fields:
+            value = get_field(context)
+            if value is not None:
+                params[param] = value
+        return params
+
+    async def fetch(self, context: dict) -> dict:
+        """
+        Call the API for this member (or serve the cached response for the
+        same lookup values). Returns the JSON object response, or {} when no
+        lookup value is available. Raises after the last retry, or
+        CircuitOpenError while the circuit is open.
+        """
+        params = self.lookup_params(context)
+        if self.lookup and not params:
+            logger.debug(f"Data source {self.name}: no lookup values in context, skipping call")
+            return {}
+
+        load = self._batcher.submit if self._batcher else self._call
+        if self._cache is None:
+            return await load(params)
+        key = (self.name, json.dumps(params, sort_keys=True, default=str))
+        return await self._cache.get_or_load(key, lambda: load(params), self._ttl)
+
+    def _ttl(self, data: dict) -> float:
+        """Cache lifetime of a response — empty ("not found") ones are cached negatively."""
+        return self.ttl_seconds if data else self.negative_ttl_seconds
+
+    async def _call(self, params: dict) -> dict:
+        if self.method in ("POST", "PUT", "PATCH"):
+            request = {"json": params}
+        else:
+            request = {"params": params}
+        data = await self._guarded(self.method, self.endpoint, request)
+        return data if isinstance(data, dict) else {}
+
+    async def _call_batch(self, batch: list[dict]) -> list:
+        """Resolve a micro-batch of lookups: one batch request, or a bounded fan-out."""
+        if self.batch_endpoint:
+            data = await self._guarded("POST", self.batch_endpoint, {"json": {"requests": batch}})
+            results = data.get("results") if isinstance(data, dict) else None
+            if not isinstance(results, list) or len(results) != len(batch):
+                raise ValueError(f"Data source {self.name}: malformed batch response")
+            return [r if isinstance(r, dict) else {} for r in results]
+
+        # No batch API — call once per distinct lookup, a few connections at a time
+        distinct: dict[str, dict] = {}
+        for params in batch:
+            distinct.setdefault(json.dumps(params, sort_keys=True, default=str), params)
+
+        async def call(params):
+            async with self._fan_out:
+                return await self._call(params)
+
+        keys = list(distinct)
+        outcomes = await asyncio.gather(*(call(distinct[k]) for k in keys), return_exceptions=True)
+        by_key = dict(zip(keys, outcomes))
+        return [by_key[json.dumps(params, sort_keys=True, default=str)] for params in batch]
+
+    async def _guarded(self, method: str, url: str, request: dict) -> Any:
+        """One request through the circuit breaker, with retries."""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for data source {self.name}")
+
+        try:
+            data = await self._request_with_retries(method, url, request)
+        except (Exception, asyncio.CancelledError) as e:
+            # Cancelled = the caller's timeout expired: a hung backend counts as a
+            # failure, and a half-open trial must not stay in flight forever.
+            # A 4xx or unparsable body is the backend answering ("not found"),
+            # which must not open the circuit for valid lookups.
+            if _backend_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return data
+
+    async def _request_with_retries(self, method: str, url: str, request: dict) -> Any:
+        attempt = 0
+        while True:
+            try:
+                response = await self._client().request(
+                    method, url, headers=self.headers, **request
+                )
+                if response.status_code in RETRYABLE_STATUS and attempt < self.retries:
+                    raise _Retryable(f"HTTP {response.status_code}")
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, _Retryable) as e:
+                if attempt >= self.retries:
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                attempt += 1
+                logger.info(f"Data source {self.name}: {e} — retry {attempt}/{self.retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+class ConnectorRegistry:
+    """
+    Connectors for every data source with an api.endpoint, rebuilt when a
+    source's configuration changes (rules reload) and otherwise kept, so
+    circuit breaker state survives reloads.
+    """
+
+    def __init__(self, client: Callable[[], httpx.AsyncClient], cache: Optional[TTLCache] = None):
+        self._client = client
+        self._cache = cache
+        self._connectors: dict[str, tuple[str, HttpConnector]] = {}
+        self._config: Optional[dict] = None
+        self._current: dict[str, HttpConnector] = {}
+
+    def connectors(self, data_sources: dict) -> dict[str, HttpConnector]:
+        """{source_name: connector} for the given data_sources block."""
+        if data_sources is self._config:
+            return self._current  # Same rules snapshot as last time
+
+        current = {}
+        for name, config in data_sources.items():
+            if not isinstance(config, dict) or not config.get("api", {}).get("endpoint"):
+                continue
+            config_key = json.dumps(config, sort_keys=True)
+            cached = self._connectors.get(name)
+            if cached is None or cached[0] != config_key:
+                cached = (config_key, HttpConnector(name, config, self._client, self._cache))
+                logger.info(f"Connector configured for data source {name}: {cached[1].method} {cached[1].endpoint}")
+            current[name] = cached
+        self._connectors = current
+        self._current = {name: connector for name, (_, connector) in current.items()}
+        self._config = data_sources
+        return self._current
+
+
+def expand_env(value: str) -> str:
+    """Replace ${env.NAME} references with environment variable values."""
+    return ENV_PATTERN.sub(lambda m: os.getenv(m.group(1), ""), value)
+
+
+class _Retryable(Exception):
+    """A response worth retrying (429 / 5xx gateway errors)."""
+
+
+def _backend_failure(error: BaseException) -> bool:
+    """
+    Whether an error means the backend is unhealthy: transport errors,
+    timeouts/cancellation, 5xx and other retryable statuses. Non-retryable
+    4xx answers and malformed bodies do not count.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TransportError, _Retryable, asyncio.TimeoutError, asyncio.CancelledError))
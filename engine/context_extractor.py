@@ -5,14 +5,34 @@ Uses OpenAI GPT to extract structured member context from natural language quest
 
 IMPORTANT: AI is ONLY used here for NLP extraction.
            Rule evaluation is ALWAYS deterministic (rule_engine.py).
+
+Extraction is tiered: the deterministic local extractor runs first, and the
+LLM is only called when it is unsure of a required field (see
+local_extractor.py). LLM extractions are cached on the normalized question
+(case and whitespace folded) plus model and prompt version, so recurring
+questions skip the LLM too.
+
+extract_async() is the event-loop path used by the API: AsyncOpenAI over one
+pooled HTTP client, a concurrency limit, a per-call deadline, and optional
+hedged requests when a call runs slower than recent calls usually do.
+extract_stream() is the same path with the LLM's output streamed as it arrives.
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
-from typing import Optional
+import re
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
 
-from openai import OpenAI
+from .cache import PersistentCache
+from .local_extractor import extract_local
 
 logger = logging.getLogger(__name__)
 
@@ -63,19 +83,82 @@ Rules for extraction:
 
 Return ONLY the JSON object. No explanation, no markdown backticks."""
 
+# Changes whenever the prompt does, so cached extractions from an older prompt are not reused
+PROMPT_VERSION = hashlib.sha256(EXTRACTION_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Recent LLM call latencies kept for the hedge threshold, and how many are
+# needed before hedging starts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+
+def normalize_question(message: str) -> str:
+    """Fold case and whitespace: trivially different questions normalize alike."""
+    return _WHITESPACE.sub(" ", message).strip().casefold()
+
+
+def extraction_cache_key(message: str, model: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """Cache key for an extraction: hash of normalized question + model + prompt version."""
+    material = "\0".join((normalize_question(message), model, prompt_version))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
 
 class ContextExtractor:
     """Extract structured member context from natural language using OpenAI."""
 
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: str = "gpt-4o",
+        cache: Optional[PersistentCache] = None,
+        max_concurrency: int = 8,
+        timeout: float = 15.0,
+        hedge_percentile: Optional[float] = None,
+    ):
+        """
+        Args:
+            api_key: OpenAI API key (falls back to OPENAI_API_KEY).
+            model: Chat model used for extraction.
+            cache: Extraction cache for LLM results (None disables caching).
+            max_concurrency: LLM calls in flight at once (extract_async).
+            timeout: Deadline in seconds for one extraction call, hedge included.
+            hedge_percentile: Send a second, hedged request when the first is
+                slower than this percentile (e.g. 95) of recent call latencies;
+                None disables hedging.
+        """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY", "")
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        # How each extraction was answered (local, cache, llm, fallback) plus hedges fired
+        self.tiers: Counter = Counter()
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._semaphore: Optional[asyncio.Semaphore] = None
 
         if not self.api_key:
             logger.warning("No OpenAI API key configured — context extraction will use fallback")
             self.client = None
+            self.async_client = None
         else:
             self.client = OpenAI(api_key=self.api_key)
+            # One pooled connection set shared by every async extraction; retries
+            # are replaced by the deadline + hedge in extract_async
+            self.async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=max_concurrency * 2,
+                        max_keepalive_connections=max_concurrency,
+                    ),
+                    timeout=timeout,
+                ),
+            )
             logger.info(f"OpenAI context extractor initialized (model: {self.model})")
 
     def extract(self, user_message: str) -> dict:
@@ -93,30 +176,44 @@ class ContextExtractor:
             logger.info("No OpenAI client — using keyword fallback extraction")
             return self._fallback_extract(user_message)
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": EXTRACTION_PROMPT},
-                    {"role": "user", "content": user_message},
-                ],
-                temperature=0,  # Deterministic extraction
-                max_tokens=500,
-            )
+        context, cache_key = self._extract_without_llm(user_message)
+        if context is not None:
+            return context
 
-            raw = response.choices[0].message.content.strip()
+        # ─── Tier 3: LLM ───
+        self.tiers["llm"] += 1
+        try:
+            response = self.client.chat.completions.create(**self._completion_args(user_message))
+            return self._parse_completion(response, cache_key)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse OpenAI response as JSON: {e}")
+            return self._fallback_extract(user_message)
+        except Exception as e:
+            logger.error(f"OpenAI extraction failed: {e}")
+            return self._fallback_extract(user_message)
 
-            # Strip markdown backticks if present
-            if raw.startswith("```"):
-                raw = raw.split("\n", 1)[-1]
-                if raw.endswith("```"):
-                    raw = raw[:-3]
-                raw = raw.strip()
+    async def extract_async(self, user_message: str) -> dict:
+        """
+        extract() for the event loop: the LLM call goes through AsyncOpenAI,
+        at most max_concurrency at a time, within the timeout deadline, and
+        is hedged when it runs slower than usual.
+        """
+        if not self.async_client:
+            logger.info("No OpenAI client — using keyword fallback extraction")
+            return self._fallback_extract(user_message)
 
-            context = json.loads(raw)
-            logger.info(f"Extracted context: {json.dumps(context, indent=2)}")
+        context, cache_key = self._extract_without_llm(user_message)
+        if context is not None:
             return context
 
+        # ─── Tier 3: LLM ───
+        self.tiers["llm"] += 1
+        try:
+            response = await asyncio.wait_for(self._hedged_completion(user_message), self.timeout)
+            return self._parse_completion(response, cache_key)
+        except asyncio.TimeoutError:
+            logger.error(f"OpenAI extraction exceeded {self.timeout}s deadline")
+            return self._fallback_extract(user_message)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse OpenAI response as JSON: {e}")
             return self._fallback_extract(user_message)
@@ -124,75 +221,185 @@ class ContextExtractor:
             logger.error(f"OpenAI extraction failed: {e}")
             return self._fallback_extract(user_message)
 
-    def _fallback_extract(self, msg: str) -> dict:
+    async def extract_stream(self, user_message: str) -> AsyncIterator[tuple[str, Any]]:
         """
-        Simple keyword-based extraction when OpenAI is unavailable.
-        Used for testing without an API key.
+        extract_async() that also reports LLM output as it arrives: yields
+        ("token", text) per streamed chunk, then ("context", dict) once.
+        Local, cached and fallback extractions yield only the context.
+        Streamed calls are not hedged — tokens already sent can't be taken back.
         """
-        msg_lower = msg.lower()
-        context = {}
-
-        # Customer type
-        if "broker" in msg_lower:
-            context["HCCustomerType"] = "Broker"
-        elif "provider" in msg_lower:
-            context["HCCustomerType"] = "Provider"
-            context["ParentName"] = "Provider"
-        else:
-            context["HCCustomerType"] = "Member"
-
-        # State detection
-        state_map = {
-            "virginia": "VA", "california": "CA", "nevada": "NV",
-            "georgia": "GA", "missouri": "MO", "colorado": "CO",
-            "wisconsin": "WI", "new york": "NY", "texas": "TX",
-            "florida": "FL", "ohio": "OH", "pennsylvania": "PA",
+        if not self.async_client:
+            logger.info("No OpenAI client — using keyword fallback extraction")
+            yield "context", self._fallback_extract(user_message)
+            return
+
+        context, cache_key = self._extract_without_llm(user_message)
+        if context is not None:
+            yield "context", context
+            return
+
+        # ─── Tier 3: LLM, streamed ───
+        self.tiers["llm"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        parts: list[str] = []
+        try:
+            async with self._limiter():
+                started = time.monotonic()
+                stream = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(
+                        **self._completion_args(user_message), stream=True
+                    ),
+                    self.timeout,
+                )
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), deadline - loop.time())
+                        except StopAsyncIteration:
+                            break
+                        text = chunk.choices[0].delta.content if chunk.choices else None
+                        if text:
+                            parts.append(text)
+                            yield "token", text
+                finally:
+                    await stream.close()
+                self._latencies.append(time.monotonic() - started)
+            context = self._parse_content("".join(parts), cache_key)
+        except asyncio.TimeoutError:
+            logger.error(f"OpenAI extraction exceeded {self.timeout}s deadline")
+            context = self._fallback_extract(user_message)
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse OpenAI response as JSON: {e}")
+            context = self._fallback_extract(user_message)
+        except Exception as e:
+            logger.error(f"OpenAI extraction failed: {e}")
+            context = self._fallback_extract(user_message)
+        yield "context", context
+
+    def _extract_without_llm(self, user_message: str) -> tuple[Optional[dict], Optional[str]]:
+        """Tiers 1 and 2. Returns (context or None, cache key for storing the LLM result)."""
+        # ─── Tier 1: local extraction, when it is sure of every required field ───
+        local = extract_local(user_message)
+        if not local.needs_llm():
+            self.tiers["local"] += 1
+            logger.info(f"Extracted context locally: {json.dumps(local.context, indent=2)}")
+            return local.context, None
+
+        # ─── Tier 2: cached LLM extraction ───
+        cache_key = None
+        if self.cache is not None:
+            cache_key = extraction_cache_key(user_message, self.model)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.tiers["cache"] += 1
+                logger.info("Extracted context served from cache")
+                return dict(cached), None
+        return None, cache_key
+
+    def _completion_args(self, user_message: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            "temperature": 0,  # Deterministic extraction
+            "max_tokens": 500,
         }
-        for name, code in state_map.items():
-            if name in msg_lower or f" {code.lower()} " in f" {msg_lower} ":
-                context["Policy.PolicyState"] = code
-                break
-
-        # Account type
-        if "fehbp" in msg_lower or "federal employee" in msg_lower:
-            context["account_type"] = "FEHBP"
-            context["has_fehbp_address"] = True
-        elif "shbp" in msg_lower or "state health benefit" in msg_lower:
-            context["account_type"] = "SHBP"
-        elif "national" in msg_lower:
-            context["Policy.BusinessUnit"] = "National"
-            context["account_type"] = "National"
-        elif "individual" in msg_lower or "exchange" in msg_lower or "marketplace" in msg_lower:
-            context["Policy.MBUCode"] = "IND"
-            context["account_type"] = "Individual"
-
-        # Funding type
-        if "aso" in msg_lower or "self-funded" in msg_lower or "self funded" in msg_lower:
-            context["IsASO"] = True
-        elif "fully insured" in msg_lower:
-            context["IsASO"] = False
-            context["funding_type"] = "Fully Insured"
-        else:
-            context["IsASO"] = False
-
-        # Expedited
-        if "expedited" in msg_lower:
-            context["IsVAExpedited"] = True
-
-        # Written vs verbal
-        if "written" in msg_lower or "in writing" in msg_lower or "write" in msg_lower:
-            context["is_written_request"] = True
-            context["IsGandAInWritingAllowed"] = "Yes"
-        if "verbal" in msg_lower or "over the phone" in msg_lower or "call" in msg_lower:
-            context["IsVerbalGandAAllowed"] = "Yes"
-
-        # Request type
-        if "appeal" in msg_lower and "grievance" in msg_lower:
-            context["request_type"] = "both"
-        elif "appeal" in msg_lower:
-            context["request_type"] = "appeal"
-        else:
-            context["request_type"] = "grievance"
 
+    def _parse_completion(self, response, cache_key: Optional[str]) -> dict:
+        """Parse the JSON answer of a completion and cache it."""
+        return self._parse_content(response.choices[0].message.content, cache_key)
+
+    def _parse_content(self, content: str, cache_key: Optional[str]) -> dict:
+        raw = content.strip()
+
+        # Strip markdown backticks if present
+        if raw.startswith("```"):
+            raw = raw.split("\n", 1)[-1]
+            if raw.endswith("```"):
+                raw = raw[:-3]
+            raw = raw.strip()
+
+        context = json.loads(raw)
+        logger.info(f"Extracted context: {json.dumps(context, indent=2)}")
+        if cache_key is not None and isinstance(context, dict):
+            self.cache.put(cache_key, context)
+            context = dict(context)
+        return context
+
+    # ─── Async LLM calls: concurrency limit, latency tracking, hedging ───
+
+    async def _hedged_completion(self, user_message: str):
+        """
+        Run one completion; if it is still pending after the hedge delay and a
+        concurrency slot is free, race a second identical request against it.
+        The first successful response wins and the other call is cancelled.
+        """
+        args = self._completion_args(user_message)
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._timed_completion(args)
+
+        pending = {asyncio.ensure_future(self._timed_completion(args))}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or self._limiter().locked():
+                return await pending.pop()
+
+            self.tiers["hedged"] += 1
+            logger.info(f"Hedging OpenAI extraction after {delay:.2f}s")
+            pending.add(asyncio.ensure_future(self._timed_completion(args)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Loser of the race, or everything when the deadline cancels us
+            for task in pending:
+                task.cancel()
+
+    async def _timed_completion(self, args: dict):
+        async with self._limiter():
+            started = time.monotonic()
+            response = await self.async_client.chat.completions.create(**args)
+            self._latencies.append(time.monotonic() - started)
+            return response
+
+    def _limiter(self) -> asyncio.Semaphore:
+        # Created on first use so it belongs to the serving event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def hedge_delay(self) -> Optional[float]:
+        """Latency at hedge_percentile of recent calls, or None (hedging off / too few samples)."""
+        if self.hedge_percentile is None or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    async def aclose(self):
+        """Close the pooled async HTTP connections."""
+        if self.async_client is not None:
+            await self.async_client.close()
+
+    def stats(self) -> dict:
+        """Extractions answered per tier, for health/metrics endpoints."""
+        return dict(self.tiers)
+
+    def _fallback_extract(self, msg: str) -> dict:
+        """
+        Keyword-based extraction when OpenAI is unavailable or fails.
+        Used for testing without an API key.
+        """
+        self.tiers["fallback"] += 1
+        context = extract_local(msg).context
         logger.info(f"Fallback extracted context: {json.dumps(context, indent=2)}")
         return context
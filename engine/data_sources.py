@@ -5,13 +5,83 @@ Resolves external data source lookups (FEHBP address, GroupDetails, AccountType)
 
 For POC: Returns mock data based on context.
 For Production: Replace mock methods with real HTTP calls to actual APIs.
+
+AsyncDataSourceResolver issues all lookups concurrently over one pooled
+httpx.AsyncClient, each with its own timeout, so a request waits for the
+slowest backend rather than the sum of them, and a failing or slow backend
+yields an empty result for that source instead of failing the request.
+
+Both resolvers can also hand out LazyDataSources: a mapping that fetches a
+source the first time the rule engine (or a message placeholder) reads it,
+so sources that the matching rule never checks are never fetched.
 """
 
+import asyncio
 import logging
-from typing import Optional
+import threading
+from collections.abc import Mapping
+from typing import Any, Callable, Optional
+
+import httpx
+
+from .cache import TTLCache
+from .connectors import ConnectorRegistry
 
 logger = logging.getLogger(__name__)
 
+SOURCE_NAMES = ("fehbp_address", "group_details", "account_type")
+
+
+class LazyDataSources(Mapping):
+    """
+    Data source results fetched on first access and memoized for the rest
+    of the request.
+
+    Lookups (ds[name], ds.get(name), name in ds) cover every source that has
+    a loader; iteration and len() cover only the sources fetched so far, so
+    {k: bool(v) for k, v in ds.items()} reports what was actually resolved.
+    """
+
+    def __init__(self, loaders: dict[str, Callable[[], Any]], blocking: bool = False):
+        """
+        Args:
+            loaders: {source_name: zero-argument function returning its data}.
+            blocking: True when a loader waits on the event loop (see
+                AsyncDataSourceResolver.lazy) — evaluate off the loop then.
+        """
+        self._loaders = loaders
+        self._results: dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.blocking = blocking
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return self._results[name]
+        except KeyError:
+            pass
+        loader = self._loaders[name]  # KeyError for unknown sources, like a dict
+        with self._lock:
+            if name not in self._results:
+                self._results[name] = loader()
+                logger.info(f"Lazily resolved data source: {name}")
+            return self._results[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._loaders
+
+    def __iter__(self):
+        return iter(dict(self._results))
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def is_resolved(self, name: str) -> bool:
+        return name in self._results or name not in self._loaders
+
+    def pending(self) -> bool:
+        """True while some source has not been fetched yet."""
+        return len(self._results) < len(self._loaders)
+
 
 class DataSourceResolver:
     """
@@ -36,15 +106,37 @@ class DataSourceResolver:
                 "account_type": {"AccountType": "SHBP", ...} or {}
             }
         """
-        results = {
-            "fehbp_address": self._resolve_fehbp(context),
-            "group_details": self._resolve_group_details(context),
-            "account_type": self._resolve_account_type(context),
-        }
+        results = {name: self.resolve_source(name, context) for name in SOURCE_NAMES}
 
         logger.info(f"Resolved data sources: { {k: bool(v) for k, v in results.items()} }")
         return results
 
+    def resolve_many(self, contexts: list[dict]) -> list[dict]:
+        """Resolve data sources for a batch of contexts, in input order."""
+        results = [
+            {name: self.resolve_source(name, context) for name in SOURCE_NAMES}
+            for context in contexts
+        ]
+        logger.info(f"Resolved data sources for batch of {len(results)} contexts")
+        return results
+
+    def lazy(self, context: dict) -> LazyDataSources:
+        """Data sources for context, each resolved only when first read."""
+        return LazyDataSources(
+            {name: (lambda name=name: self.resolve_source(name, context)) for name in SOURCE_NAMES}
+        )
+
+    def resolve_source(self, name: str, context: dict) -> dict:
+        """Resolve one data source by name ({} for unknown sources)."""
+        if name == "fehbp_address":
+            return self._resolve_fehbp(context)
+        if name == "group_details":
+            return self._resolve_group_details(context)
+        if name == "account_type":
+            return self._resolve_account_type(context)
+        logger.warning(f"Unknown data source: {name}")
+        return {}
+
     def _resolve_fehbp(self, context: dict) -> dict:
         """
         D_FEHBPCaseandAddressData lookup.
@@ -107,3 +199,154 @@ class DataSourceResolver:
             return {"AccountType": "Individual"}
         else:
             return {"AccountType": ""}
+
+
+class AsyncDataSourceResolver:
+    """
+    Resolve all data sources concurrently, with per-source timeouts.
+
+    In mock mode the lookups are answered in-process by DataSourceResolver.
+    In http mode a source is fetched, in order of preference:
+      1. from an explicit endpoint (POSTed the whole member context),
+      2. through the generic connector built from its api block in the
+         rules' data_sources config (see engine/connectors.py),
+      3. from the in-process mock.
+    Results have the same shape as DataSourceResolver.resolve_all(), plus
+    any configured sources beyond the built-in three; a source that times
+    out or errors resolves to {} (partial results).
+    """
+
+    def __init__(
+        self,
+        mode: str = "mock",
+        endpoints: Optional[dict[str, str]] = None,
+        timeouts: Optional[dict[str, float]] = None,
+        default_timeout: float = 2.0,
+        client: Optional[httpx.AsyncClient] = None,
+        max_connections: int = 100,
+        data_sources: Optional[Callable[[], dict]] = None,
+        cache_size: int = 10000,
+    ):
+        """
+        Args:
+            mode: "mock" or "http".
+            endpoints: {source_name: URL} for http mode.
+            timeouts: {source_name: seconds}; others use default_timeout.
+            default_timeout: Timeout in seconds for sources not in timeouts.
+            client: Shared AsyncClient (created lazily with a connection
+                pool of max_connections when not given).
+            data_sources: Returns the current data_sources config block
+                (e.g. lambda: rule_engine.data_sources); connectors follow
+                rule reloads.
+            cache_size: Max cached connector responses, shared by the sources
+                that enable caching in their config (0 disables).
+        """
+        self.mode = mode
+        self.endpoints = endpoints or {}
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_connections = max_connections
+        self._client = client
+        self._mock = DataSourceResolver(mode="mock")
+        self._data_sources = data_sources
+        self.cache = TTLCache(cache_size)
+        self._registry = ConnectorRegistry(lambda: self.client, self.cache)
+        logger.info(f"AsyncDataSourceResolver initialized in {mode} mode")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled HTTP client, kept alive across requests."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def connectors(self) -> dict:
+        """Configured HTTP connectors by source name (http mode only)."""
+        if self.mode != "http" or self._data_sources is None:
+            return {}
+        return self._registry.connectors(self._data_sources())
+
+    def source_names(self) -> tuple:
+        """The built-in sources plus any other configured with a connector."""
+        extra = tuple(name for name in self.connectors() if name not in SOURCE_NAMES)
+        return SOURCE_NAMES + extra
+
+    async def resolve_all(self, context: dict) -> dict:
+        """Resolve every data source concurrently (see DataSourceResolver.resolve_all)."""
+        names = self.source_names()
+        values = await asyncio.gather(*(self.resolve_source(name, context) for name in names))
+        results = dict(zip(names, values))
+        logger.info(f"Resolved data sources: { {k: bool(v) for k, v in results.items()} }")
+        return results
+
+    async def resolve_many(self, contexts: list[dict]) -> list[dict]:
+        """
+        Resolve data sources for a batch of contexts, in input order.
+        Contexts in flight are capped so lookups don't queue for a pooled
+        connection long enough to hit their timeouts.
+        """
+        limit = asyncio.Semaphore(max(1, self.max_connections // len(SOURCE_NAMES)))
+
+        async def resolve(context):
+            async with limit:
+                return await self.resolve_all(context)
+
+        return list(await asyncio.gather(*(resolve(context) for context in contexts)))
+
+    def lazy(self, context: dict, loop: asyncio.AbstractEventLoop) -> LazyDataSources:
+        """
+        Data sources for context, each resolved only when first read.
+
+        Mock sources load inline. HTTP sources are fetched on loop and waited
+        for by the reading thread, so the mapping is then marked blocking and
+        must be read from a worker thread (asyncio.to_thread), not the loop.
+        """
+        loaders = {}
+        blocking = False
+        connectors = self.connectors()
+        for name in self.source_names():
+            if self.mode == "http" and (self.endpoints.get(name) or name in connectors):
+                blocking = True
+                loaders[name] = lambda name=name: asyncio.run_coroutine_threadsafe(
+                    self.resolve_source(name, context), loop
+                ).result()
+            else:
+                loaders[name] = lambda name=name: self._mock.resolve_source(name, context)
+        return LazyDataSources(loaders, blocking=blocking)
+
+    async def resolve_source(self, name: str, context: dict) -> dict:
+        """Resolve one source within its timeout; {} on timeout or error."""
+        timeout = self.timeouts.get(name, self.default_timeout)
+        try:
+            return await asyncio.wait_for(self._fetch(name, context), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Data source {name} timed out after {timeout}s")
+        except Exception as e:
+            logger.warning(f"Data source {name} failed: {e}")
+        return {}
+
+    async def _fetch(self, name: str, context: dict) -> dict:
+        if self.mode != "http":
+            return self._mock.resolve_source(name, context)
+
+        url = self.endpoints.get(name)
+        if not url:
+            connector = self.connectors().get(name)
+            if connector is not None:
+                return await connector.fetch(context)
+            return self._mock.resolve_source(name, context)
+
+        response = await self.client.post(url, json=context)
+        response.raise_for_status()
+        data = response.json()
+        return data if isinstance(data, dict) else {}
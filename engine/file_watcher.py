@@ -0,0 +1,136 @@
+"""
+File Watcher
+============
+Polls rule and message files and fires a callback when one really changed,
+so edits go live without POST /api/reload.
+
+Stdlib only (no inotify dependency): each poll is one stat() per file, and
+a file is only read and hashed after its mtime/size changed AND then stayed
+put for the debounce window — editors that save in several writes trigger
+one reload, and a touch without a content change triggers none.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# callback(path, deleted)
+ChangeCallback = Callable[[Path, bool], None]
+
+
+class _Tracked:
+    """Last known state of one file."""
+
+    __slots__ = ("signature", "digest", "pending_since")
+
+    def __init__(self, signature: Optional[tuple], digest: Optional[str]):
+        self.signature = signature
+        self.digest = digest
+        self.pending_since: Optional[float] = None
+
+
+class FileWatcher:
+    """Background polling watcher with debouncing and content hashing."""
+
+    def __init__(self, interval: float = 0.5, debounce: float = 0.2):
+        self.interval = interval
+        self.debounce = debounce
+        self._watches: list[tuple[Path, Optional[str], ChangeCallback]] = []
+        self._files: dict[Path, tuple[_Tracked, ChangeCallback]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, path: str | Path, callback: ChangeCallback, pattern: Optional[str] = None):
+        """
+        Watch a single file, or every file matching pattern in a directory
+        (files created later are picked up too).
+        """
+        self._watches.append((Path(path), pattern, callback))
+        for file_path in self._expand(Path(path), pattern):
+            self._files[file_path] = (_Tracked(_signature(file_path), _digest(file_path)), callback)
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"File watcher started ({len(self._files)} files, every {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 4)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"File watcher poll failed: {e}")
+
+    def poll(self, now: Optional[float] = None):
+        """Check every watched file once; fire callbacks for settled changes."""
+        now = time.monotonic() if now is None else now
+
+        # Pick up files created since the last poll
+        for root, pattern, callback in self._watches:
+            for file_path in self._expand(root, pattern):
+                if file_path not in self._files:
+                    self._files[file_path] = (_Tracked(None, None), callback)
+
+        for file_path, (tracked, callback) in list(self._files.items()):
+            signature = _signature(file_path)
+            if signature != tracked.signature:
+                tracked.signature = signature
+                tracked.pending_since = now
+                continue
+
+            if tracked.pending_since is None or now - tracked.pending_since < self.debounce:
+                continue
+            tracked.pending_since = None
+
+            digest = _digest(file_path)
+            if digest == tracked.digest:
+                continue  # Touched or rewritten with identical content
+            tracked.digest = digest
+
+            deleted = digest is None
+            logger.info(f"File {'deleted' if deleted else 'changed'}: {file_path}")
+            try:
+                callback(file_path, deleted)
+            except Exception as e:
+                logger.error(f"Reload after change to {file_path} failed: {e}")
+
+            if deleted and not file_path.parent.exists():
+                del self._files[file_path]
+
+    @staticmethod
+    def _expand(root: Path, pattern: Optional[str]) -> list[Path]:
+        if pattern is None:
+            return [root]
+        if not root.is_dir():
+            return []
+        return sorted(root.glob(pattern))
+
+
+def _signature(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _digest(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
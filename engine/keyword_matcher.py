@@ -0,0 +1,172 @@
+"""
+Keyword Matcher
+===============
+Aho-Corasick automaton that finds every keyword phrase in a message in a
+single pass, however many phrases there are — adding the full US state
+table or another synonym list costs nothing per message.
+
+Matching is case-insensitive (phrases can opt into exact case, e.g. "IN"
+the state vs "in" the word), whitespace runs in the text match a single
+space in a phrase, and a match must start and end on a word boundary:
+"call" does not match "recall" and "aso" does not match "reason".
+Overlapping matches resolve leftmost-longest, so "west virginia" wins
+over "virginia".
+"""
+
+from collections import deque
+from typing import Any, Iterator
+
+# Every whitespace character → " " (length-preserving)
+_SPACES = {code: " " for code in range(0x3001) if chr(code).isspace()}
+
+
+class KeywordMatch:
+    """One phrase found in the text: span in the original text and its payloads."""
+
+    __slots__ = ("start", "end", "phrase", "payloads")
+
+    def __init__(self, start: int, end: int, phrase: str, payloads: list):
+        self.start = start
+        self.end = end
+        self.phrase = phrase
+        self.payloads = payloads
+
+    def __repr__(self) -> str:
+        return f"KeywordMatch({self.phrase!r}, {self.start}, {self.end})"
+
+
+class KeywordMatcher:
+    """Multi-phrase matcher; add() phrases, then find() (the automaton builds on first use)."""
+
+    def __init__(self):
+        # Trie: per state, next char → state; phrase id per terminal state
+        self._goto: list[dict[str, int]] = [{}]
+        self._terminal: list[int] = [-1]
+        self._phrases: list[str] = []
+        # Per phrase: [(payload, exact_text or None)]
+        self._entries: list[list[tuple[Any, str | None]]] = []
+        # Built automaton: full transition table (char → state) and phrase ids per state
+        self._delta: list[dict[str, int]] = []
+        self._output: list[tuple[int, ...]] = []
+        self._built = False
+
+    def add(self, phrase: str, payload: Any, case_sensitive: bool = False):
+        """
+        Register a phrase. A phrase added several times reports every payload.
+
+        Args:
+            phrase: Words separated by single spaces.
+            payload: Returned with each match.
+            case_sensitive: Only match this exact casing (e.g. "OK" the state).
+        """
+        key = " ".join(phrase.split()).lower()
+        state = 0
+        for char in key:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._terminal.append(-1)
+            state = next_state
+
+        if self._terminal[state] < 0:
+            self._terminal[state] = len(self._phrases)
+            self._phrases.append(key)
+            self._entries.append([])
+        exact = " ".join(phrase.split()) if case_sensitive else None
+        self._entries[self._terminal[state]].append((payload, exact))
+        self._built = False
+
+    def _build(self):
+        """
+        Compute failure links breadth-first over the trie, and fold them into a
+        full transition table so scanning is one dict lookup per character.
+        """
+        goto = self._goto
+        size = len(goto)
+        fail = [0] * size
+        delta: list[dict[str, int]] = [{}] * size
+        output: list[tuple[int, ...]] = [()] * size
+
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            own = (self._terminal[state],) if self._terminal[state] >= 0 else ()
+            output[state] = own + output[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(char, 0)
+                queue.append(next_state)
+
+        self._delta = delta
+        self._output = output
+        self._built = True
+
+    def find(self, text: str) -> list[KeywordMatch]:
+        """Non-overlapping, leftmost-longest matches on word boundaries, in text order."""
+        candidates = sorted(self._scan(text), key=lambda match: (match.start, -match.end))
+        matches: list[KeywordMatch] = []
+        last_end = 0
+        for match in candidates:
+            if match.start >= last_end:
+                matches.append(match)
+                last_end = match.end
+        return matches
+
+    def _scan(self, text: str) -> Iterator[KeywordMatch]:
+        """Every phrase occurrence that sits on word boundaries and passes its case check."""
+        if not self._built:
+            self._build()
+        delta, output, phrases = self._delta, self._output, self._phrases
+
+        chars = _fold(text)
+        # Original index of every character fed to the automaton, when whitespace
+        # runs had to be collapsed to one " " (None: fed text lines up with text)
+        positions = None
+        if "  " in chars:
+            positions = [
+                index for index, char in enumerate(chars)
+                if char != " " or index == 0 or chars[index - 1] != " "
+            ]
+            chars = "".join(chars[index] for index in positions)
+
+        state = 0
+        for fed, char in enumerate(chars, 1):
+            state = delta[state].get(char, 0)
+            if not output[state]:
+                continue
+            for phrase_id in output[state]:
+                phrase = phrases[phrase_id]
+                if positions is None:
+                    start, end = fed - len(phrase), fed
+                else:
+                    start, end = positions[fed - len(phrase)], positions[fed - 1] + 1
+                if not (_boundary(text, start - 1) and _boundary(text, end)):
+                    continue
+                payloads = [
+                    payload for payload, exact in self._entries[phrase_id]
+                    if exact is None or " ".join(text[start:end].split()) == exact
+                ]
+                if payloads:
+                    yield KeywordMatch(start, end, phrase, payloads)
+
+
+def _fold(text: str) -> str:
+    """Lowercase with whitespace as " ", keeping one character per input character."""
+    folded = text.lower().translate(_SPACES)
+    if len(folded) == len(text):
+        return folded
+    # Rare: a character whose lowercase is longer (e.g. "İ") — keep it as-is
+    return "".join(
+        char.lower() if len(char.lower()) == 1 else char for char in text
+    ).translate(_SPACES)
+
+
+def _boundary(text: str, index: int) -> bool:
+    """True when text[index] is outside the text or not part of a word."""
+    if index < 0 or index >= len(text):
+        return True
+    char = text[index]
+    return not (char.isalnum() or char == "_" or char == "-")
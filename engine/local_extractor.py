@@ -0,0 +1,281 @@
+"""
+Local Context Extractor
+=======================
+Deterministic first tier of context extraction. One keyword pass over the
+message (an Aho-Corasick automaton built at import, see keyword_matcher.py)
+recognizes customer types, all 50 states and their abbreviations, account
+types, funding phrases, verbal/written cues and request types, and every
+extracted field carries a confidence score.
+
+ContextExtractor only calls the LLM when a required field is missing,
+weak or contradicted (e.g. two different states, or a negated cue like
+"not an FEHBP account"), or when the message holds details keywords can't
+capture (group numbers, member IDs) — formulaic questions such as
+"I'm a member in Virginia with an FEHBP account" never leave the process.
+"""
+
+import re
+from typing import Any, Optional
+
+from .keyword_matcher import KeywordMatcher
+
+# ─── Confidence levels ───
+EXPLICIT = 1.0  # Stated outright: "FEHBP", "in Virginia", "I'm a broker"
+IMPLIED = 0.8   # Documented default (same one the LLM prompt applies)
+WEAK = 0.5      # Loose cue, or a value contradicted by another one
+
+CONFIDENCE_THRESHOLD = 0.8
+
+# Fields that must be confidently known to skip the LLM
+REQUIRED_FIELDS = ("HCCustomerType", "Policy.PolicyState")
+
+STATES = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR",
+    "california": "CA", "colorado": "CO", "connecticut": "CT", "delaware": "DE",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID",
+    "illinois": "IL", "indiana": "IN", "iowa": "IA", "kansas": "KS",
+    "kentucky": "KY", "louisiana": "LA", "maine": "ME", "maryland": "MD",
+    "massachusetts": "MA", "michigan": "MI", "minnesota": "MN", "mississippi": "MS",
+    "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK",
+    "oregon": "OR", "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC",
+    "south dakota": "SD", "tennessee": "TN", "texas": "TX", "utah": "UT",
+    "vermont": "VT", "virginia": "VA", "washington": "WA", "west virginia": "WV",
+    "wisconsin": "WI", "wyoming": "WY",
+}
+
+# Abbreviations that are also everyday words or abbreviations ("in", "me",
+# "ok", "Ms.", "mi", "G&A"...) only count in uppercase; the rest match in any
+# case ("va", "Tx")
+AMBIGUOUS_STATE_CODES = frozenset({
+    "AL", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IN", "LA", "MA", "MD", "ME",
+    "MI", "MO", "MS", "MT", "NE", "OH", "OK", "OR", "PA", "SC",
+})
+
+# Codes common in uppercase too ("member ID", "my MD", "a PA", "MS") are only
+# a weak cue, so the LLM confirms them unless the state is also named outright
+WEAK_STATE_CODES = frozenset({"CO", "ID", "MD", "MS", "OR", "PA"})
+
+# Field each keyword group sets (reported when the group is contradicted)
+GROUP_FIELDS = {
+    "customer": "HCCustomerType", "state": "Policy.PolicyState", "account": "account_type",
+    "funding": "IsASO", "coverage": "Policy.CoverageTypeCode", "expedited": "IsVAExpedited",
+    "written": "is_written_request", "verbal": "IsVerbalGandAAllowed",
+    "appeal": "request_type", "grievance": "request_type",
+}
+
+# A negation this many words or fewer before a cue (same clause) negates it
+NEGATION_WINDOW = 3
+_CLAUSE_BREAK = re.compile(r"[.,;:!?()]")
+
+# Details only the LLM extracts: digit runs and group/ID phrases
+UNEXTRACTED_PATTERN = re.compile(
+    r"\d{3,}|\b(?:group|member|subscriber|policy|employee|company)\s*(?:id|#|no\b|num|number|code)"
+    r"|\b(?:eid|mbu|source system)\b",
+    re.IGNORECASE,
+)
+
+# phrase → [(group, value, confidence)]
+KEYWORDS: dict[str, list[tuple[str, Any, float]]] = {}
+
+
+def _keywords(group: str, value: Any, *phrases: str, confidence: float = EXPLICIT):
+    for phrase in phrases:
+        KEYWORDS.setdefault(phrase, []).append((group, value, confidence))
+
+
+_keywords("customer", "Member", "member", "members", "subscriber")
+_keywords("customer", "Broker", "broker", "brokers")
+_keywords("customer", "Provider", "provider", "providers", "doctor's office")
+
+for _name, _code in STATES.items():
+    _keywords("state", _code, _name)
+
+# Not a state: outranks "washington" (leftmost-longest) and leaves the state to the LLM
+_keywords("conflict", "Policy.PolicyState", "washington dc", "washington d.c", "washington d.c.",
+          "washington, dc", "washington, d.c", "washington, d.c.", "district of columbia")
+
+_keywords("account", "FEHBP", "fehbp", "federal employee", "federal employees",
+          "federal employee health benefits")
+_keywords("account", "SHBP", "shbp", "state health benefit", "state health benefits",
+          "state health benefit plan")
+_keywords("account", "National", "national account", "national accounts")
+_keywords("account", "National", "national", confidence=WEAK)
+_keywords("account", "Individual", "individual", "exchange", "marketplace")
+
+_keywords("funding", "ASO", "aso", "self-funded", "self funded", "administrative services")
+_keywords("funding", "Fully Insured", "fully insured", "fully-insured")
+
+_keywords("coverage", "MED", "medical")
+_keywords("coverage", "DEN", "dental")
+_keywords("coverage", "VIS", "vision")
+
+_keywords("expedited", True, "expedited", "urgent")
+_keywords("written", True, "written", "in writing", "write", "letter", "mail")
+_keywords("verbal", True, "verbal", "verbally", "over the phone", "by phone", "call")
+_keywords("appeal", True, "appeal", "appeals", "appealing")
+_keywords("grievance", True, "grievance", "grievances", "complaint")
+
+_keywords("negation", None, "not", "no", "never", "without", "neither", "nor", "cannot",
+          "don't", "doesn't", "didn't", "isn't", "aren't", "wasn't", "won't", "can't",
+          "don’t", "doesn’t", "didn’t", "isn’t", "aren’t", "wasn’t", "won’t", "can’t")
+
+# ─── Built once at import; leftmost-longest, so "national account" wins over "national" ───
+KEYWORD_MATCHER = KeywordMatcher()
+for _phrase, _entries in KEYWORDS.items():
+    for _entry in _entries:
+        KEYWORD_MATCHER.add(_phrase, _entry)
+for _code in sorted(set(STATES.values())):
+    KEYWORD_MATCHER.add(
+        _code,
+        ("state", _code, WEAK if _code in WEAK_STATE_CODES else EXPLICIT),
+        case_sensitive=_code in AMBIGUOUS_STATE_CODES,
+    )
+
+
+class LocalExtraction:
+    """Extracted context plus per-field confidence and contradicted fields."""
+
+    __slots__ = ("context", "confidence", "conflicts", "unextracted")
+
+    def __init__(self):
+        self.context: dict = {}
+        self.confidence: dict[str, float] = {}
+        self.conflicts: list[str] = []
+        # Message holds details (group numbers, IDs) the keyword pass can't extract
+        self.unextracted = False
+
+    def set(self, field: str, value: Any, confidence: float):
+        self.context[field] = value
+        self.confidence[field] = confidence
+
+    def conflict(self, field: str):
+        if field not in self.conflicts:
+            self.conflicts.append(field)
+
+    def needs_llm(
+        self,
+        required: tuple[str, ...] = REQUIRED_FIELDS,
+        threshold: float = CONFIDENCE_THRESHOLD,
+    ) -> bool:
+        """
+        True when a required field is missing or weak, any field is
+        contradicted, or the message holds details only the LLM extracts.
+        """
+        if self.conflicts or self.unextracted:
+            return True
+        return any(self.confidence.get(field, 0.0) < threshold for field in required)
+
+
+def extract_local(message: str) -> LocalExtraction:
+    """
+    Extract member context with keyword matching only.
+
+    Returns:
+        LocalExtraction; .context has the same shape the LLM tier returns.
+    """
+    # group → {value: (confidence, first position)}
+    found: dict[str, dict[Any, tuple[float, int]]] = {}
+
+    def add(group: str, value: Any, confidence: float, position: int):
+        values = found.setdefault(group, {})
+        previous = values.get(value)
+        if previous is None or confidence > previous[0]:
+            values[value] = (confidence, position if previous is None else previous[1])
+
+    result = LocalExtraction()
+    result.unextracted = UNEXTRACTED_PATTERN.search(message) is not None
+
+    negation_end: Optional[int] = None
+    for match in KEYWORD_MATCHER.find(message):
+        group = match.payloads[0][0]
+        if group == "negation":
+            negation_end = match.end
+            continue
+        if group == "conflict":
+            result.conflict(match.payloads[0][1])
+            continue
+        if negation_end is not None and _negates(message[negation_end:match.start]):
+            # "not an FEHBP account", "I do not want to call": keywords can't
+            # tell what is meant instead, so the cue counts as a contradiction
+            for group, _, _ in match.payloads:
+                result.conflict(GROUP_FIELDS[group])
+            continue
+        for group, value, confidence in match.payloads:
+            add(group, value, confidence, match.start)
+
+    def pick(group: str, field: str) -> Optional[tuple[Any, float]]:
+        """Strongest value of a group; several equally strong values conflict."""
+        values = found.get(group)
+        if not values:
+            return None
+        best = max(confidence for confidence, _ in values.values())
+        strongest = sorted(
+            (position, value) for value, (confidence, position) in values.items()
+            if confidence == best
+        )
+        if len(strongest) > 1:
+            result.conflict(field)
+            best = WEAK
+        return strongest[0][1], best
+
+    # Customer type (defaults to Member, as the LLM prompt does)
+    customer = pick("customer", "HCCustomerType")
+    if customer is None:
+        result.set("HCCustomerType", "Member", IMPLIED)
+    else:
+        result.set("HCCustomerType", *customer)
+        if customer[0] == "Provider":
+            result.set("ParentName", "Provider", customer[1])
+
+    state = pick("state", "Policy.PolicyState")
+    if state is not None:
+        result.set("Policy.PolicyState", *state)
+
+    account = pick("account", "account_type")
+    if account is not None:
+        value, confidence = account
+        result.set("account_type", value, confidence)
+        if value == "FEHBP":
+            result.set("has_fehbp_address", True, confidence)
+        elif value == "National":
+            result.set("Policy.BusinessUnit", "National", confidence)
+        elif value == "Individual":
+            result.set("Policy.MBUCode", "IND", confidence)
+
+    funding = pick("funding", "IsASO")
+    if funding is None:
+        result.set("IsASO", False, IMPLIED)
+    elif funding[0] == "ASO":
+        result.set("IsASO", True, funding[1])
+    else:
+        result.set("IsASO", False, funding[1])
+        result.set("funding_type", "Fully Insured", funding[1])
+
+    coverage = pick("coverage", "Policy.CoverageTypeCode")
+    if coverage is not None:
+        result.set("Policy.CoverageTypeCode", *coverage)
+
+    if "expedited" in found and result.context.get("Policy.PolicyState") == "VA":
+        result.set("IsVAExpedited", True, EXPLICIT)
+
+    if "written" in found:
+        result.set("is_written_request", True, EXPLICIT)
+        result.set("IsGandAInWritingAllowed", "Yes", EXPLICIT)
+    if "verbal" in found:
+        result.set("IsVerbalGandAAllowed", "Yes", EXPLICIT)
+
+    if "appeal" in found and "grievance" in found:
+        result.set("request_type", "both", EXPLICIT)
+    elif "appeal" in found:
+        result.set("request_type", "appeal", EXPLICIT)
+    else:
+        result.set("request_type", "grievance", EXPLICIT if "grievance" in found else IMPLIED)
+
+    return result
+
+
+def _negates(gap: str) -> bool:
+    """True when the text between a negation and a cue keeps them in one short phrase."""
+    return len(gap.split()) <= NEGATION_WINDOW and not _CLAUSE_BREAK.search(gap)
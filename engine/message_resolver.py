@@ -3,57 +3,112 @@ Message Resolver
 ================
 Loads Markdown message templates and resolves {{placeholders}} with actual values.
 Business analysts edit these .md files directly — no code changes needed.
+
+Templates are split once, at load time, into literal chunks and compiled
+placeholder lookups, so resolving a message is a single join with no regex
+work per request. Rendered HTML is cached per (template, resolved values),
+so Markdown conversion only runs for value combinations not seen recently.
 """
 
 import logging
 import re
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional, Union
 
 import markdown
 
+from .cache import LRUCache
+
 logger = logging.getLogger(__name__)
 
+MARKDOWN_EXTENSIONS = ["tables", "nl2br"]
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(.+?)\}\}")
+
+# A compiled placeholder: (context, data_source_results) -> replacement text
+PlaceholderLookup = Callable[[dict, dict], str]
+# A compiled template: literal chunks interleaved with placeholder lookups
+TemplateParts = tuple[Union[str, PlaceholderLookup], ...]
+
 
 class MessageResolver:
     """Load and render Markdown message templates."""
 
-    def __init__(self, messages_dir: str = "messages"):
+    def __init__(self, messages_dir: str = "messages", html_cache_size: int = 1024):
+        """
+        Args:
+            messages_dir: Directory holding the .md templates.
+            html_cache_size: Max rendered HTML documents kept (0 disables).
+        """
         self.messages_dir = Path(messages_dir)
         self.cache: dict[str, str] = {}
+        self._compiled: dict[str, TemplateParts] = {}
+        self.html_cache = LRUCache(html_cache_size)
         self._load_all()
 
     def _load_all(self):
         """Pre-load all .md files into cache."""
+        cache = self._read_all()
+        self._compiled = {key: _compile_template(body) for key, body in cache.items()}
+        self.cache = cache
+        self.html_cache.clear()
+        logger.info(f"Loaded {len(self.cache)} message templates from {self.messages_dir}")
+
+    def _read_all(self) -> dict[str, str]:
+        """Read every .md file into a new dict (the live cache is not touched)."""
+        cache: dict[str, str] = {}
         if not self.messages_dir.exists():
             logger.warning(f"Messages directory not found: {self.messages_dir}")
-            return
+            return cache
 
         for md_file in self.messages_dir.glob("*.md"):
             key = md_file.stem  # filename without extension
-            content = md_file.read_text(encoding="utf-8")
+            cache[key] = self._read_file(md_file)
 
-            # Strip YAML frontmatter (between --- markers)
-            parts = content.split("---")
-            if len(parts) >= 3:
-                body = "---".join(parts[2:]).strip()
-            else:
-                body = content.strip()
+        return cache
 
-            self.cache[key] = body
-
-        logger.info(f"Loaded {len(self.cache)} message templates from {self.messages_dir}")
+    @staticmethod
+    def _read_file(md_file: Path) -> str:
+        """Read one template, stripping YAML frontmatter (between --- markers)."""
+        content = md_file.read_text(encoding="utf-8")
+        parts = content.split("---")
+        if len(parts) >= 3:
+            return "---".join(parts[2:]).strip()
+        return content.strip()
 
     def reload(self):
-        """Hot-reload messages from disk."""
-        self.cache.clear()
+        """Hot-reload messages from disk (swapped in whole, never half-loaded)."""
         self._load_all()
 
+    def reload_file(self, path: str | Path):
+        """
+        Re-read a single template (or drop it if the file is gone), leaving
+        every other template untouched. Used by the file watcher.
+        """
+        md_file = Path(path)
+        if md_file.suffix != ".md":
+            md_file = self.messages_dir / f"{md_file.name}.md"
+        key = md_file.stem
+
+        cache, compiled = dict(self.cache), dict(self._compiled)
+        if md_file.exists():
+            cache[key] = self._read_file(md_file)
+            compiled[key] = _compile_template(cache[key])
+            logger.info(f"Reloaded message template: {key}")
+        elif cache.pop(key, None) is not None:
+            compiled.pop(key, None)
+            logger.info(f"Removed message template: {key}")
+        self._compiled = compiled
+        self.cache = cache
+        self.html_cache.discard(lambda cache_key: cache_key[0] == key)
+
     def resolve(
         self,
         message_ref: str,
         context: dict,
         data_source_results: Optional[dict] = None,
+        render_html: bool = True,
     ) -> Optional[dict]:
         """
         Load a message template and fill placeholders.
@@ -63,61 +118,120 @@ class MessageResolver:
             context: Member context for placeholder resolution
             data_source_results: API response data for placeholders like
                                  {{fehbp_address.MailingAddress}}
+            render_html: Convert to HTML; when False 'html' is None.
 
         Returns:
             dict with 'markdown' (raw) and 'html' (rendered) versions,
             or None if template not found.
         """
-        template = self.cache.get(message_ref)
-        if template is None:
+        parts = self._compiled.get(message_ref)
+        if parts is None:
             logger.warning(f"Message template not found: {message_ref}")
             return None
 
-        ds = data_source_results or {}
-
-        # Resolve all {{placeholder}} patterns
-        def replace_placeholder(match):
-            placeholder = match.group(1).strip()
+        ds = data_source_results if data_source_results is not None else {}
+
+        # Literal chunks as-is, {{placeholders}} through their compiled lookups
+        pieces = tuple(
+            [part if part.__class__ is str else part(context, ds) for part in parts]
+        )
+        resolved_md = "".join(pieces)
+        if not render_html:
+            return {"markdown": resolved_md, "html": None}
+
+        # Convert to HTML — once per distinct set of resolved values. Entries
+        # remember the template version they were rendered from, so a render
+        # racing a reload can't serve HTML of the old template.
+        cache_key = (message_ref, pieces)
+        cached = self.html_cache.get(cache_key)
+        if cached is not None and cached[0] is parts:
+            html = cached[1]
+        else:
+            html = render_markdown(resolved_md)
+            self.html_cache.put(cache_key, (parts, html))
 
-            # Try data source reference: "fehbp_address.MailingAddress"
-            if "." in placeholder:
-                parts = placeholder.split(".", 1)
-                source_name = parts[0]
-
-                # Check data sources first
-                if source_name in ds:
-                    value = ds[source_name].get(parts[1], "")
-                    if value:
-                        return str(value)
+        return {
+            "markdown": resolved_md,
+            "html": html,
+        }
 
-                # Fall back to context with dotted key
-                value = context.get(placeholder)
-                if value is not None:
-                    return str(value)
+    def list_templates(self) -> list[str]:
+        """Return all available template names."""
+        return sorted(self.cache.keys())
 
-                # Try just the field name part
-                value = context.get(parts[-1])
-                if value is not None:
-                    return str(value)
 
-            # Direct context lookup
+# ─── Markdown → HTML ───
+# Building a Markdown instance registers every extension, which costs more
+# than most conversions. Each thread keeps one configured converter and
+# reset()s it between documents (instances are not thread-safe).
+_converters = threading.local()
+
+
+def render_markdown(text: str) -> str:
+    """Convert Markdown to HTML with the message extensions (tables, nl2br)."""
+    converter = getattr(_converters, "markdown", None)
+    if converter is None:
+        converter = _converters.markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    try:
+        return converter.convert(text)
+    finally:
+        converter.reset()
+
+
+def _compile_template(template: str) -> TemplateParts:
+    """Split a template body into literal chunks and placeholder lookups."""
+    parts: list = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(template):
+        if match.start() > position:
+            parts.append(template[position:match.start()])
+        parts.append(_compile_placeholder(match.group(1).strip()))
+        position = match.end()
+    if position < len(template):
+        parts.append(template[position:])
+    return tuple(parts)
+
+
+def _compile_placeholder(placeholder: str) -> PlaceholderLookup:
+    """
+    Compile one {{placeholder}} into a lookup. Resolution order:
+      1. Data source field: "fehbp_address.MailingAddress" → ds["fehbp_address"]["MailingAddress"]
+      2. Context with the dotted key: context["Policy.PolicyState"]
+      3. Context with the field name part: context["PolicyState"]
+    Non-dotted placeholders are a direct context lookup.
+    Unresolved placeholders render as "[placeholder]".
+    """
+    unresolved = f"[{placeholder}]"
+
+    def missing() -> str:
+        logger.warning(f"Unresolved placeholder: {{{{{placeholder}}}}}")
+        return unresolved
+
+    if "." not in placeholder:
+        def direct(context, ds):
             value = context.get(placeholder)
             if value is not None:
                 return str(value)
+            return missing()
 
-            logger.warning(f"Unresolved placeholder: {{{{{placeholder}}}}}")
-            return f"[{placeholder}]"
+        return direct
 
-        resolved_md = re.sub(r"\{\{(.+?)\}\}", replace_placeholder, template)
+    source_name, field = placeholder.split(".", 1)
 
-        # Convert to HTML
-        html = markdown.markdown(resolved_md, extensions=["tables", "nl2br"])
+    def dotted(context, ds):
+        # Check data sources first
+        if source_name in ds:
+            value = ds[source_name].get(field, "")
+            if value:
+                return str(value)
 
-        return {
-            "markdown": resolved_md,
-            "html": html,
-        }
+        # Fall back to context with dotted key, then just the field name part
+        value = context.get(placeholder)
+        if value is not None:
+            return str(value)
+        value = context.get(field)
+        if value is not None:
+            return str(value)
+        return missing()
 
-    def list_templates(self) -> list[str]:
-        """Return all available template names."""
-        return sorted(self.cache.keys())
+    return dotted
@@ -11,28 +11,72 @@ Supports:
   - Condition template references
   - Sub-rules
   - First-match evaluation (priority-ordered)
+
+Rules are compiled once at load time (and on reload) into a tree of
+Python closures, so evaluate() never re-walks the raw JSON. A field index
+over each rule's mandatory equality conditions narrows the rules that
+evaluate() has to try for a given context, and results are cached on the
+projection of the context onto the fields the rules actually read.
+
+Each load produces an immutable RuleSnapshot (config + compiled rules +
+index + cache). reload() builds the new snapshot off to the side and swaps
+it in with a single reference assignment, so in-flight evaluations finish
+against the snapshot they started with and never see torn state. A reload
+reuses the compiled form of every rule whose JSON is unchanged (when the
+templates are unchanged too), so editing one rule recompiles one rule.
 """
 
 import json
 import logging
+import threading
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
+
+from .cache import LRUCache
+from .data_sources import LazyDataSources
 
 logger = logging.getLogger(__name__)
 
+# A compiled condition: (context, data_source_results, memo) -> bool
+# memo is a per-evaluation list holding results of shared (memoized) nodes.
+Predicate = Callable[[dict, dict, list], bool]
+
+EMPTY_VALUES = (None, "", [], False, 0)
+EMPTY_OR_FALSE_VALUES = (None, "", [], False, 0, "false", "False")
+EMPTY_SOURCE_VALUES = (None, "", [])
+
+# Operators that compare normalized values; fields read only by these can be
+# cached on their normalized value ("VA" and " va" are equivalent).
+NORMALIZED_OPS = frozenset({"eq", "equals", "neq", "not_equals", "in", "not_in"})
+
+# Incremental reloads keep the memo slots and read fields of removed rules
+# around; every Nth reload is a full compile that drops them.
+MAX_INCREMENTAL_RELOADS = 16
+
 
 class RuleEngine:
     """Loads JSON rules and evaluates them against member context."""
 
-    def __init__(self, rules_path: str = "rules/ga_rules.json"):
+    def __init__(
+        self,
+        rules_path: str = "rules/ga_rules.json",
+        flatten_context: bool = False,
+        cache_size: int = 4096,
+    ):
+        """
+        Args:
+            rules_path: Path to the rules JSON file.
+            flatten_context: Resolve every field the rules reference once per
+                evaluate() call into a flat dict, so each leaf condition is a
+                single dict lookup. Pays off when many rules read the same fields.
+            cache_size: Max entries in the evaluate() result cache (0 disables).
+        """
         self.rules_path = Path(rules_path)
-        self.config = self._load_rules()
-        self.rules = sorted(
-            [r for r in self.config.get("rules", []) if r.get("active", True)],
-            key=lambda r: r.get("priority", 999),
-        )
-        self.templates = self.config.get("condition_templates", {})
-        self.data_sources = self.config.get("data_sources", {})
+        self.flatten_context = flatten_context
+        self.cache_size = cache_size
+        self._reload_lock = threading.Lock()
+        self._snapshot = self._build_snapshot()
         logger.info(f"Loaded {len(self.rules)} active rules from {rules_path}")
 
     def _load_rules(self) -> dict:
@@ -40,15 +84,48 @@ class RuleEngine:
         with open(self.rules_path, "r") as f:
             return json.load(f)
 
-    def reload(self):
-        """Hot-reload rules from disk (supports dynamic updates)."""
-        self.config = self._load_rules()
-        self.rules = sorted(
-            [r for r in self.config.get("rules", []) if r.get("active", True)],
-            key=lambda r: r.get("priority", 999),
+    def _build_snapshot(self, previous: Optional["RuleSnapshot"] = None) -> "RuleSnapshot":
+        return RuleSnapshot(
+            self._load_rules(),
+            flatten_context=self.flatten_context,
+            cache_size=self.cache_size,
+            previous=previous,
         )
-        self.templates = self.config.get("condition_templates", {})
-        logger.info(f"Reloaded {len(self.rules)} rules")
+
+    def reload(self):
+        """
+        Hot-reload rules from disk (supports dynamic updates).
+
+        The new snapshot is loaded and compiled without touching the live one,
+        then published with one reference assignment. Concurrent reloads are
+        serialized; evaluations never wait on a reload. Unchanged rules are
+        carried over from the live snapshot instead of being recompiled.
+        """
+        with self._reload_lock:
+            snapshot = self._build_snapshot(previous=self._snapshot)
+            self._snapshot = snapshot
+        logger.info(f"Reloaded {len(snapshot.rules)} rules ({snapshot.recompiled} recompiled)")
+
+    @property
+    def snapshot(self) -> "RuleSnapshot":
+        """The currently published rule snapshot."""
+        return self._snapshot
+
+    @property
+    def config(self) -> dict:
+        return self._snapshot.config
+
+    @property
+    def rules(self) -> list:
+        return self._snapshot.rules
+
+    @property
+    def templates(self) -> dict:
+        return self._snapshot.templates
+
+    @property
+    def data_sources(self) -> dict:
+        return self._snapshot.data_sources
 
     def evaluate(
         self, context: dict, data_source_results: Optional[dict] = None
@@ -71,46 +148,205 @@ class RuleEngine:
                     "group_details": {"FundingTypeCode": "E"},
                     "account_type": {"AccountType": "SHBP"}
                 }
+                or a LazyDataSources, whose sources are fetched only when a
+                rule being tried reads them.
 
         Returns:
             Matching rule dict with id, name, message_ref, placeholders
             or None if no rule matches.
         """
-        ds = data_source_results or {}
+        return self._snapshot.evaluate(context, data_source_results)
 
-        for rule in self.rules:
-            rule_id = rule.get("id", "unknown")
-            conditions = rule.get("conditions", {})
+    def evaluate_many(
+        self, contexts: list[dict], data_source_results: Optional[list[dict]] = None
+    ) -> list[Optional[dict]]:
+        """
+        Evaluate a batch of member contexts (first-match per context).
+
+        Args:
+            contexts: List of member context dicts.
+            data_source_results: Optional list of pre-resolved data source
+                results, parallel to contexts.
+
+        Returns:
+            List of match dicts (or None), one per context, in input order.
+        """
+        snapshot = self._snapshot  # One rule version for the whole batch
+        if data_source_results is None:
+            return [snapshot.evaluate(context) for context in contexts]
+        if len(data_source_results) != len(contexts):
+            raise ValueError(
+                f"Got {len(contexts)} contexts but {len(data_source_results)} data source results"
+            )
+        return [snapshot.evaluate(c, ds) for c, ds in zip(contexts, data_source_results)]
+
+    def evaluate_columns(
+        self, columns: dict, data_source_columns: Optional[dict] = None
+    ) -> list[Optional[str]]:
+        """
+        Evaluate column-oriented contexts with mask algebra (offline re-scoring).
+
+        Args:
+            columns: {context_key: sequence of values}, one entry per member,
+                e.g. {"HCCustomerType": [...], "Policy.PolicyState": [...]}.
+                Lists, NumPy arrays and pandas Series are accepted.
+            data_source_columns: {source_name: sequence of per-member dicts}.
+
+        Returns:
+            Matching rule_id (or None) per member — the same ids evaluate()
+            gives for the equivalent row contexts.
+        """
+        from .columnar import ColumnarEvaluator
+
+        return ColumnarEvaluator(self._snapshot).evaluate(columns, data_source_columns)
+
+    def flatten(self, context: dict) -> dict:
+        """Flat view of the fields the current rules read (see RuleSnapshot.flatten)."""
+        return self._snapshot.flatten(context)
+
+    def cache_stats(self) -> dict:
+        """Result cache counters (size, hits, misses) for the current snapshot."""
+        return self._snapshot.cache_stats()
+
+    def get_all_rules(self) -> list:
+        """Return all rules with metadata (for /api/rules endpoint)."""
+        return [
+            {
+                "id": r.get("id"),
+                "name": r.get("name"),
+                "priority": r.get("priority"),
+                "active": r.get("active", True),
+                "tags": r.get("tags", []),
+                "message_ref": r.get("message_ref"),
+            }
+            for r in self.rules
+        ]
 
+    def get_rule_by_id(self, rule_id: str) -> Optional[dict]:
+        """Return a specific rule by ID."""
+        for r in self.rules:
+            if r.get("id") == rule_id:
+                return r
+        return None
+
+
+class RuleSnapshot:
+    """
+    One immutable, fully compiled version of the rules file: config,
+    priority-ordered rules, compiled predicates, field index and result cache.
+    Never mutated after construction — reload() replaces it wholesale.
+
+    Given the previous snapshot, rules whose JSON is unchanged reuse its
+    compiled predicates, and if nothing that affects results changed the
+    result cache is carried over as well.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        flatten_context: bool = False,
+        cache_size: int = 4096,
+        previous: Optional["RuleSnapshot"] = None,
+    ):
+        self.config = config
+        self.rules = sorted(
+            [r for r in config.get("rules", []) if r.get("active", True)],
+            key=lambda r: r.get("priority", 999),
+        )
+        self.templates = config.get("condition_templates", {})
+        self.data_sources = config.get("data_sources", {})
+        self.flatten_context = flatten_context
+        self._compiled = self._compile_rules(previous)
+        self._index = self._build_index()
+        self._cache = LRUCache(cache_size) if cache_size > 0 else None
+        # Context key → the data sources its cached result depended on
+        self._cache_sources = LRUCache(cache_size) if cache_size > 0 else None
+
+        if (
+            previous is not None
+            and self.recompiled == 0
+            and len(self._compiled) == len(previous._compiled)
+            and all(a is b for a, b in zip(self._compiled, previous._compiled))
+            and (self._cache is None) == (previous._cache is None)
+        ):
+            # Same compiled rules in the same order → same results for every key
+            self._projection = previous._projection
+            self._source_projection = previous._source_projection
+            self._cache = previous._cache
+            self._cache_sources = previous._cache_sources
+
+    def evaluate(
+        self, context: dict, data_source_results: Optional[dict] = None
+    ) -> Optional[dict]:
+        """Evaluate against this snapshot (see RuleEngine.evaluate)."""
+        ds = data_source_results if data_source_results is not None else {}
+        cache = self._cache
+        key = None
+
+        if cache is not None:
+            # Evaluation is deterministic in the fields the rules read, so the
+            # projection onto those fields is a complete cache key. Context
+            # fields come first; only the sources the cached result depended
+            # on are read, so lazy sources the rules never needed stay unfetched.
             try:
-                if self._evaluate_block(conditions, context, ds):
-                    logger.info(f"Rule MATCHED: {rule_id} (priority {rule.get('priority')})")
+                context_key = tuple(get(context) for get in self._projection)
+                sources = self._cache_sources.get(context_key, ())
+                key = self._cache_key(context_key, sources, ds)
+                cached = cache.get(key, _MISSING)
+            except Exception:
+                key, cached = None, _MISSING  # Unhashable or unreadable — evaluate uncached
+            if cached is not _MISSING:
+                logger.debug("Rule result served from cache")
+                return dict(cached) if cached else None
+
+        match = self._first_match(context, ds)
+        if key is not None:
+            # A lazy evaluation depends only on the sources it fetched; with
+            # plain results every source the rules read is part of the key
+            if isinstance(ds, LazyDataSources):
+                sources = tuple(name for name in self._source_projection if ds.is_resolved(name))
+            else:
+                sources = tuple(self._source_projection)
+            try:
+                key = self._cache_key(context_key, sources, ds)
+                hash(key)
+            except Exception:
+                key = None  # Unhashable or unreadable source value — don't cache
+        if key is not None:
+            if sources:
+                self._cache_sources.put(context_key, sources)
+            cache.put(key, match)
+        return dict(match) if match else None
+
+    def _cache_key(self, context_key: tuple, sources: tuple, ds: dict) -> tuple:
+        """Result cache key: context projection plus the projection of the given sources."""
+        if not sources:
+            return context_key, ()
+        projection = self._source_projection
+        return context_key, sources, tuple(
+            get(None, ds) for name in sources for get in projection[name]
+        )
+
+    def _first_match(self, context: dict, ds: dict) -> Optional[dict]:
+        """Run the compiled rules; returns the (shared) result dict of the first match."""
+        if self.flatten_context:
+            context = self.flatten(context)
+        compiled = self._compiled
+        memo = [None] * self._memo_slots  # Shared sub-conditions, computed at most once
+
+        for position in self._candidates(context, ds):
+            rule_id, priority, matches, result, sub_rules = compiled[position]
+            try:
+                if matches(context, ds, memo):
+                    logger.info(f"Rule MATCHED: {rule_id} (priority {priority})")
 
                     # Check sub-rules if present
-                    sub_rules = rule.get("sub_rules", [])
-                    if sub_rules:
-                        for sub in sub_rules:
-                            sub_conds = sub.get("conditions", {})
-                            if self._evaluate_block(sub_conds, context, ds):
-                                logger.info(f"  Sub-rule matched: {sub.get('id')}")
-                                return {
-                                    "rule_id": sub.get("id", rule_id),
-                                    "parent_rule_id": rule_id,
-                                    "name": rule.get("name", ""),
-                                    "message_ref": sub.get("message_ref", rule.get("message_ref")),
-                                    "placeholders": sub.get("placeholders", rule.get("placeholders", [])),
-                                    "priority": rule.get("priority"),
-                                    "tags": rule.get("tags", []),
-                                }
-
-                    return {
-                        "rule_id": rule_id,
-                        "name": rule.get("name", ""),
-                        "message_ref": rule.get("message_ref", ""),
-                        "placeholders": rule.get("placeholders", []),
-                        "priority": rule.get("priority"),
-                        "tags": rule.get("tags", []),
-                    }
+                    for sub_id, sub_matches, sub_result in sub_rules:
+                        if sub_matches(context, ds, memo):
+                            logger.info(f"  Sub-rule matched: {sub_id}")
+                            return sub_result
+
+                    return result
             except Exception as e:
                 logger.warning(f"Error evaluating rule {rule_id}: {e}")
                 continue
@@ -118,157 +354,618 @@ class RuleEngine:
         logger.info("No rule matched for given context")
         return None
 
-    def _evaluate_block(self, block: dict, context: dict, ds: dict) -> bool:
-        """Evaluate a condition block (all/any/not or single condition)."""
+    def cache_stats(self) -> dict:
+        """Result cache counters (size, hits, misses)."""
+        if self._cache is None:
+            return {"size": 0, "maxsize": 0, "hits": 0, "misses": 0}
+        return self._cache.stats()
+
+    def flatten(self, context: dict) -> dict:
+        """
+        Resolve every field referenced by the rules into a flat dict
+        ({"Policy.PolicyState": "VA", ...}), using the same flat → nested →
+        last-segment lookup as _get_field().
+        """
+        return {field: get(context) for field, get in self._accessors}
+
+    # ═══════════════════════════════════════════
+    # Compilation (JSON conditions → closures)
+    # ═══════════════════════════════════════════
+
+    def _compile_rules(self, previous: Optional["RuleSnapshot"] = None) -> list[tuple]:
+        """
+        Compile active rules into evaluation tuples, in priority order:
+            (rule_id, priority, predicate, result, [(sub_id, predicate, result), ...])
+
+        Results are built once here; evaluate() hands out shallow copies.
+        Sets self._memo_slots to the number of memoized (shared) nodes and
+        self.recompiled to the number of rules not reused from previous.
+        """
+        reusable = self._reusable_rules(previous)
+        if reusable:
+            # Continue the previous pass, so reused predicates keep their memo
+            # slots and new shared nodes get fresh ones
+            state = previous._state.extend(self._shared_node_keys())
+        else:
+            state = _CompileState(self._shared_node_keys())
+        compiled = []
+        self.recompiled = 0
+
+        for rule in self.rules:
+            rule_key = _structural_key(rule)
+            if rule_key in reusable:
+                compiled.append(reusable[rule_key])
+                continue
+
+            self.recompiled += 1
+            rule_id = rule.get("id", "unknown")
+            try:
+                matches = self._compile_block(rule.get("conditions", {}), state, ())
+                sub_rules = [
+                    (
+                        sub.get("id"),
+                        self._compile_block(sub.get("conditions", {}), state, ()),
+                        {
+                            "rule_id": sub.get("id", rule_id),
+                            "parent_rule_id": rule_id,
+                            "name": rule.get("name", ""),
+                            "message_ref": sub.get("message_ref", rule.get("message_ref")),
+                            "placeholders": sub.get("placeholders", rule.get("placeholders", [])),
+                            "priority": rule.get("priority"),
+                            "tags": rule.get("tags", []),
+                        },
+                    )
+                    for sub in rule.get("sub_rules", [])
+                ]
+            except Exception as e:
+                logger.warning(f"Error compiling rule {rule_id}: {e}")
+                matches, sub_rules = _raiser(e), []
+
+            result = {
+                "rule_id": rule_id,
+                "name": rule.get("name", ""),
+                "message_ref": rule.get("message_ref", ""),
+                "placeholders": rule.get("placeholders", []),
+                "priority": rule.get("priority"),
+                "tags": rule.get("tags", []),
+            }
+            compiled.append((rule_id, rule.get("priority"), matches, result, sub_rules))
+
+        self._state = state
+        self._rule_keys = {
+            key: entry for key, entry in zip(map(_structural_key, self.rules), compiled) if key is not None
+        }
+        self._memo_slots = state.slots
+        self._accessors = tuple((f, _field_accessor(f)) for f in sorted(state.fields))
+        self._projection, self._source_projection = self._build_projection(state)
+        return compiled
+
+    def _reusable_rules(self, previous: Optional["RuleSnapshot"]) -> dict:
+        """Compiled rules from previous that are still valid, keyed by rule JSON."""
+        if (
+            previous is None
+            or previous.flatten_context != self.flatten_context
+            or previous.templates != self.templates
+            or previous._state.generation >= MAX_INCREMENTAL_RELOADS
+        ):
+            return {}
+        return previous._rule_keys
+
+    def _build_projection(self, state: "_CompileState") -> tuple:
+        """
+        Getters for everything the compiled rules read, used as the result
+        cache key: one per context field and data-source field (normalized when
+        only eq/neq/in/not_in read it, raw otherwise), plus an emptiness
+        signature per data source checked as a whole.
+
+        Returns:
+            (context getters, {source_name: getters of that source}) — sources
+            are keyed separately so a lookup reads only the ones it needs.
+        """
+        context_projection = []
+        source_projection: dict[str, list] = {}
+        for key in sorted(state.reads, key=repr):
+            if key[0] == "source":
+                read = _source_field_reader(key[1], key[2])
+                if state.reads[key] <= NORMALIZED_OPS:
+                    read = _normalized(read, _normalize)
+                source_projection.setdefault(key[1], []).append(read)
+            else:
+                read = _field_accessor(key[1])
+                if state.reads[key] <= NORMALIZED_OPS:
+                    read = _normalized_field(read, _normalize)
+                context_projection.append(read)
+        for source_name in state.sources:
+            source_projection.setdefault(source_name, []).append(_source_signature(source_name))
+        return tuple(context_projection), {
+            name: tuple(source_projection[name]) for name in sorted(source_projection)
+        }
+
+    def _shared_node_keys(self) -> set:
+        """
+        Structural keys of condition nodes that occur more than once across
+        the rule set (template references, identical leaves or sub-blocks).
+        Only these are memoized — memoizing a node used once costs more than
+        it saves. Template bodies are counted once, as they compile once.
+        """
+        counts: dict[str, int] = {}
+        visited_templates: set = set()
+
+        def visit(block):
+            key = _structural_key(block)
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+            if not isinstance(block, dict):
+                return
+            if "use_template" in block:
+                name = block["use_template"]
+                template = self.templates.get(name)
+                if isinstance(template, dict) and name not in visited_templates:
+                    visited_templates.add(name)
+                    visit(template)
+            elif "all" in block or "any" in block:
+                children = block["all"] if "all" in block else block["any"]
+                if isinstance(children, list):
+                    for child in children:
+                        visit(child)
+            elif "not" in block:
+                visit(block["not"])
 
-        # Template reference — resolve and evaluate
+        for rule in self.rules:
+            visit(rule.get("conditions", {}))
+            for sub in rule.get("sub_rules", []):
+                if isinstance(sub, dict):
+                    visit(sub.get("conditions", {}))
+
+        return {key for key, count in counts.items() if count > 1}
+
+    def _compile_block(self, block: dict, state: "_CompileState", stack: tuple) -> Predicate:
+        """Compile a block, reusing (and memoizing) nodes shared across rules."""
+        key = _structural_key(block)
+        if key in state.shared:
+            if key not in state.nodes:
+                state.nodes[key] = state.memoize(self._compile_node(block, state, stack))
+            return state.nodes[key]
+        return self._compile_node(block, state, stack)
+
+    def _compile_node(self, block: dict, state: "_CompileState", stack: tuple) -> Predicate:
+        """Compile a condition block (all/any/not, template ref or single condition)."""
+
+        # Template reference — compiled once and shared by every rule using it
         if "use_template" in block:
             template_name = block["use_template"]
+            if template_name in state.templates:
+                return state.templates[template_name]
             template = self.templates.get(template_name)
             if template is None:
                 logger.warning(f"Template not found: {template_name}")
-                return False
-            return self._evaluate_block(template, context, ds)
+                return _never
+            if template_name in stack:
+                return _raiser(ValueError(f"Cyclic template reference: {template_name}"))
+            compiled = self._compile_block(template, state, stack + (template_name,))
+            state.templates[template_name] = compiled
+            return compiled
 
         # ALL — every condition must be true
         if "all" in block:
-            return all(self._evaluate_block(c, context, ds) for c in block["all"])
+            children = tuple(self._compile_block(c, state, stack) for c in block["all"])
+
+            def all_of(context, ds, memo):
+                for child in children:
+                    if not child(context, ds, memo):
+                        return False
+                return True
+
+            return all_of
 
         # ANY — at least one condition must be true
         if "any" in block:
-            return any(self._evaluate_block(c, context, ds) for c in block["any"])
+            children = tuple(self._compile_block(c, state, stack) for c in block["any"])
+
+            def any_of(context, ds, memo):
+                for child in children:
+                    if child(context, ds, memo):
+                        return True
+                return False
+
+            return any_of
 
         # NOT — invert the result
         if "not" in block:
-            return not self._evaluate_block(block["not"], context, ds)
+            inner = self._compile_block(block["not"], state, stack)
+            return lambda context, ds, memo: not inner(context, ds, memo)
 
         # Single condition
-        return self._evaluate_condition(block, context, ds)
+        return self._compile_condition(block, state)
 
-    def _evaluate_condition(self, cond: dict, context: dict, ds: dict) -> bool:
-        """Evaluate a single condition."""
+    def _compile_condition(self, cond: dict, state: Optional["_CompileState"] = None) -> Predicate:
+        """Compile a single condition into a predicate."""
         op = cond.get("op", "eq")
 
         # Data source check (e.g., "fehbp_address is_not_empty")
         if "source" in cond and "field" not in cond:
             source_name = cond["source"]
-            source_data = ds.get(source_name, {})
+            if state is not None:
+                state.sources.add(source_name)
 
             if op == "is_not_empty":
-                return bool(source_data) and any(
-                    v not in (None, "", []) for v in source_data.values()
-                )
+                def source_not_empty(context, ds, memo=None):
+                    source_data = ds.get(source_name, {})
+                    return bool(source_data) and any(
+                        v not in EMPTY_SOURCE_VALUES for v in source_data.values()
+                    )
+                return source_not_empty
+
             elif op == "is_empty":
-                return not source_data or all(
-                    v in (None, "", []) for v in source_data.values()
-                )
-            return bool(source_data)
+                def source_empty(context, ds, memo=None):
+                    source_data = ds.get(source_name, {})
+                    return not source_data or all(
+                        v in EMPTY_SOURCE_VALUES for v in source_data.values()
+                    )
+                return source_empty
+
+            return lambda context, ds, memo=None: bool(ds.get(source_name, {}))
+
+        test = self._compile_compare(cond.get("val"), op)
 
         # Data source field check (e.g., group_details.FundingTypeCode in [E,G,H])
         if "source" in cond and "field" in cond:
             source_name = cond["source"]
             field = cond["field"]
-            source_data = ds.get(source_name, {})
-            actual = source_data.get(field)
-            expected = cond.get("val")
-            return self._compare(actual, expected, op)
+            if state is not None:
+                state.reads.setdefault(("source", source_name, field), set()).add(op)
+            return lambda context, ds, memo=None: test(ds.get(source_name, {}).get(field))
 
-        # Direct field check from context
+        # Direct field check from context — path resolved to an accessor once, here
         field = cond.get("field", "")
-        actual = self._get_field(context, field)
-        expected = cond.get("val")
+        if state is not None:
+            state.fields.add(field)
+            state.reads.setdefault(("field", field), set()).add(op)
+        get_field = itemgetter(field) if self.flatten_context else _field_accessor(field)
+        return lambda context, ds, memo=None: test(get_field(context))
 
-        return self._compare(actual, expected, op)
+    def _compile_compare(self, expected: Any, op: str) -> Callable[[Any], bool]:
+        """Build a test of an actual value against an expected value, normalized up front."""
+        normalize = _normalize
 
-    def _compare(self, actual: Any, expected: Any, op: str) -> bool:
-        """Compare actual value against expected using operator."""
         if op in ("eq", "equals"):
-            return self._normalize(actual) == self._normalize(expected)
+            target = self._prepare_expected(expected, op)
+            return lambda actual: normalize(actual) == target
 
         elif op in ("neq", "not_equals"):
-            return self._normalize(actual) != self._normalize(expected)
-
-        elif op == "in":
-            if isinstance(expected, list):
-                return self._normalize(actual) in [self._normalize(e) for e in expected]
-            return self._normalize(actual) == self._normalize(expected)
+            target = self._prepare_expected(expected, op)
+            return lambda actual: normalize(actual) != target
+
+        elif op in ("in", "not_in"):
+            options = self._prepare_expected(expected, op)
+            if isinstance(options, frozenset):
+                def is_member(actual):
+                    try:
+                        return normalize(actual) in options
+                    except TypeError:
+                        # Unhashable actual (list/dict) can't equal any hashable option
+                        return False
+            elif isinstance(options, tuple):
+                def is_member(actual):
+                    return normalize(actual) in options
+            else:
+                def is_member(actual):
+                    return normalize(actual) == options
 
-        elif op == "not_in":
-            if isinstance(expected, list):
-                return self._normalize(actual) not in [self._normalize(e) for e in expected]
-            return self._normalize(actual) != self._normalize(expected)
+            if op == "in":
+                return is_member
+            return lambda actual: not is_member(actual)
 
         elif op == "is_empty":
-            return actual in (None, "", [], False, 0)
+            return lambda actual: actual in EMPTY_VALUES
 
         elif op == "is_not_empty":
-            return actual not in (None, "", [], False, 0)
+            return lambda actual: actual not in EMPTY_VALUES
 
         elif op == "exists_with_value":
-            return actual is not None and actual != "" and actual != []
+            return lambda actual: actual is not None and actual != "" and actual != []
 
         elif op == "is_empty_or_false":
-            return actual in (None, "", [], False, 0, "false", "False")
+            return lambda actual: actual in EMPTY_OR_FALSE_VALUES
 
         else:
             logger.warning(f"Unknown operator: {op}")
-            return False
+            return lambda actual: False
+
+    # ═══════════════════════════════════════════
+    # Field index (discrimination net)
+    # ═══════════════════════════════════════════
 
-    def _get_field(self, context: dict, field: str) -> Any:
+    def _build_index(self) -> list[tuple]:
         """
-        Get field value from context.
-        Supports dotted paths: 'Policy.PolicyState' looks up:
-          1. context['Policy.PolicyState']  (flat key)
-          2. context['Policy']['PolicyState']  (nested)
-          3. context['PolicyState']  (short name fallback)
+        Bucket rules by the values their mandatory equality conditions accept.
+
+        A condition is mandatory when it sits on an all-only path from the
+        rule root (through nested "all" blocks and templates); such a rule
+        cannot match unless the field equals one of the accepted values.
+        Returns one entry per indexed key:
+            (value_getter, {value: candidate_mask}, default_mask, source_name)
+        Masks are int bitsets over positions in self._compiled; source_name
+        is None for context fields.
         """
-        # Try flat key first
-        if field in context:
-            return context[field]
+        constraints: dict[tuple, dict[int, frozenset]] = {}
+
+        for position, rule in enumerate(self.rules):
+            try:
+                found = self._mandatory_equalities(rule.get("conditions", {}), ())
+            except Exception:
+                continue  # Malformed rule — leave it unindexed
+            for key, values in found:
+                per_rule = constraints.setdefault(key, {})
+                per_rule[position] = per_rule[position] & values if position in per_rule else values
+
+        all_mask = (1 << len(self._compiled)) - 1
+        index = []
+        for key, per_rule in constraints.items():
+            default = all_mask
+            for position in per_rule:
+                default &= ~(1 << position)
+
+            buckets: dict[Any, int] = {}
+            for position, values in per_rule.items():
+                for value in values:
+                    buckets[value] = buckets.get(value, default) | (1 << position)
+
+            source_name = key[1] if key[0] == "source" else None
+            index.append((self._index_getter(key), buckets, default, source_name))
+
+        return index
+
+    def _mandatory_equalities(self, block: dict, stack: tuple) -> list[tuple]:
+        """Collect (key, accepted_values) for equality conditions every match must satisfy."""
+        if "use_template" in block:
+            name = block["use_template"]
+            template = self.templates.get(name)
+            if template is None or name in stack:
+                return []
+            return self._mandatory_equalities(template, stack + (name,))
+
+        if "all" in block:
+            found = []
+            for child in block["all"]:
+                found.extend(self._mandatory_equalities(child, stack))
+            return found
+
+        if "any" in block or "not" in block or "field" not in block:
+            return []
+
+        op = block.get("op", "eq")
+        if op not in ("eq", "equals", "in"):
+            return []
+
+        expected = self._prepare_expected(block.get("val"), op)
+        if isinstance(expected, frozenset):
+            values = expected
+        elif isinstance(expected, tuple):
+            return []  # Unhashable options can't be bucketed
+        else:
+            try:
+                values = frozenset((expected,))
+            except TypeError:
+                return []
+
+        if "source" in block:
+            return [(("source", block["source"], block["field"]), values)]
+        return [(("field", block["field"]), values)]
+
+    def _index_getter(self, key: tuple) -> Callable[[dict, dict], Any]:
+        """Value lookup for an index key, normalized exactly like the conditions it stands for."""
+        normalize = _normalize
+        if key[0] == "source":
+            _, source_name, field = key
+            return lambda context, ds: normalize(ds.get(source_name, {}).get(field))
+        field = key[1]
+        if self.flatten_context:
+            return lambda context, ds: normalize(context.get(field))
+        get_field = _field_accessor(field)
+        return lambda context, ds: normalize(get_field(context))
+
+    def _candidates(self, context: dict, ds: dict):
+        """Yield positions of rules that can still match this context, in priority order."""
+        candidates = (1 << len(self._compiled)) - 1
+        lazy = isinstance(ds, LazyDataSources)
+
+        for get_value, buckets, default, source_name in self._index:
+            if lazy and source_name is not None and not ds.is_resolved(source_name):
+                continue  # Narrowing on it would fetch it; let the rules decide
+            try:
+                candidates &= buckets.get(get_value(context, ds), default)
+            except Exception:
+                # Unhashable or unreadable value — no constrained rule can match it
+                candidates &= default
+            if not candidates:
+                return
+
+        while candidates:
+            lowest = candidates & -candidates
+            yield lowest.bit_length() - 1
+            candidates ^= lowest
+
+    def _prepare_expected(self, expected: Any, op: str) -> Any:
+        """
+        Normalize a condition's expected value once, at load time.
+        List values for in/not_in become frozensets (O(1), allocation-free
+        membership); lists holding unhashable items fall back to a tuple.
+        """
+        if op in ("in", "not_in") and isinstance(expected, list):
+            options = [_normalize(e) for e in expected]
+            try:
+                return frozenset(options)
+            except TypeError:
+                return tuple(options)
+        return _normalize(expected)
+
+
+def _get_field(context: dict, field: str) -> Any:
+    """
+    Get field value from context.
+    Supports dotted paths: 'Policy.PolicyState' looks up:
+      1. context['Policy.PolicyState']  (flat key)
+      2. context['Policy']['PolicyState']  (nested)
+      3. context['PolicyState']  (short name fallback)
+    """
+    # Try flat key first
+    if field in context:
+        return context[field]
+
+    # Try nested path
+    parts = field.split(".")
+    current = context
+    for part in parts:
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            # Fallback: try the last segment
+            return context.get(parts[-1])
+    return current
 
-        # Try nested path
-        parts = field.split(".")
+
+def _normalize(val: Any) -> Any:
+    """Normalize values for comparison (case-insensitive strings, bool handling)."""
+    if val is None:
+        return None
+    if isinstance(val, bool):
+        return val
+    if isinstance(val, str):
+        low = val.lower().strip()
+        if low == "true":
+            return True
+        if low == "false":
+            return False
+        return low
+    return val
+
+
+class _CompileState:
+    """Bookkeeping for one compilation pass (templates, shared nodes, memo slots)."""
+
+    def __init__(self, shared: set):
+        self.shared = shared
+        self.fields: set[str] = set()
+        self.reads: dict[tuple, set] = {}  # (kind, ...) → ops applied to it
+        self.sources: set[str] = set()  # Sources checked as a whole (is_empty...)
+        self.nodes: dict[str, Predicate] = {}
+        self.templates: dict[str, Predicate] = {}
+        self.slots = 0
+        self.generation = 0  # Incremental passes since the last full compile
+
+    def extend(self, shared: set) -> "_CompileState":
+        """
+        A copy for an incremental pass: keeps everything recorded so far
+        (reused predicates still read those fields and use those slots)
+        and only adds to it. Shared nodes and templates compiled earlier
+        are reused as-is.
+        """
+        state = _CompileState(shared)
+        state.fields = set(self.fields)
+        state.reads = {key: set(ops) for key, ops in self.reads.items()}
+        state.sources = set(self.sources)
+        state.nodes = dict(self.nodes)
+        state.templates = dict(self.templates)
+        state.slots = self.slots
+        state.generation = self.generation + 1
+        return state
+
+    def memoize(self, inner: Predicate) -> Predicate:
+        """Wrap a shared node so it runs at most once per evaluate() call."""
+        slot = self.slots
+        self.slots += 1
+
+        def memoized(context, ds, memo):
+            result = memo[slot]
+            if result is None:
+                result = memo[slot] = inner(context, ds, memo)
+            return result
+
+        return memoized
+
+
+_MISSING = object()
+
+
+def _field_accessor(field: str) -> Callable[[dict], Any]:
+    """
+    Specialized equivalent of _get_field() for one field path,
+    with the path split once here instead of on every lookup.
+    """
+    if "." not in field:
+        # Flat key; the nested walk and last-segment fallback are the same key
+        return lambda context: context.get(field)
+
+    parts = field.split(".")
+    last = parts[-1]
+
+    if len(parts) == 2:
+        head = parts[0]
+
+        def two_level(context):
+            value = context.get(field, _MISSING)
+            if value is not _MISSING:
+                return value
+            inner = context.get(head)
+            if isinstance(inner, dict) and last in inner:
+                return inner[last]
+            return context.get(last)
+
+        return two_level
+
+    def nested(context):
+        value = context.get(field, _MISSING)
+        if value is not _MISSING:
+            return value
         current = context
         for part in parts:
             if isinstance(current, dict) and part in current:
                 current = current[part]
             else:
-                # Fallback: try the last segment
-                return context.get(parts[-1])
+                return context.get(last)
         return current
 
-    def _normalize(self, val: Any) -> Any:
-        """Normalize values for comparison (case-insensitive strings, bool handling)."""
-        if val is None:
-            return None
-        if isinstance(val, bool):
-            return val
-        if isinstance(val, str):
-            low = val.lower().strip()
-            if low == "true":
-                return True
-            if low == "false":
-                return False
-            return low
-        return val
+    return nested
 
-    def get_all_rules(self) -> list:
-        """Return all rules with metadata (for /api/rules endpoint)."""
-        return [
-            {
-                "id": r.get("id"),
-                "name": r.get("name"),
-                "priority": r.get("priority"),
-                "active": r.get("active", True),
-                "tags": r.get("tags", []),
-                "message_ref": r.get("message_ref"),
-            }
-            for r in self.rules
-        ]
 
-    def get_rule_by_id(self, rule_id: str) -> Optional[dict]:
-        """Return a specific rule by ID."""
-        for r in self.rules:
-            if r.get("id") == rule_id:
-                return r
+def _source_field_reader(source_name: str, field: str) -> Callable[[dict, dict], Any]:
+    return lambda context, ds: ds.get(source_name, {}).get(field)
+
+
+def _normalized(read: Callable, normalize: Callable) -> Callable[[dict, dict], Any]:
+    return lambda context, ds: normalize(read(context, ds))
+
+
+def _normalized_field(get_field: Callable, normalize: Callable) -> Callable[[dict], Any]:
+    return lambda context: normalize(get_field(context))
+
+
+def _source_signature(source_name: str) -> Callable[[dict, dict], tuple]:
+    """Everything the whole-source checks can observe: (non-empty?, any non-empty value?)."""
+    def signature(context, ds):
+        source_data = ds.get(source_name, {})
+        if not source_data:
+            return (False, False)
+        return (True, any(v not in EMPTY_SOURCE_VALUES for v in source_data.values()))
+    return signature
+
+
+def _structural_key(block: Any) -> Optional[str]:
+    """Canonical JSON of a condition block; identical conditions share a key."""
+    try:
+        return json.dumps(block, sort_keys=True)
+    except (TypeError, ValueError):
         return None
+
+
+def _never(context: dict, ds: dict, memo: Optional[list] = None) -> bool:
+    """Predicate for unresolvable references (e.g. a missing template)."""
+    return False
+
+
+def _raiser(error: Exception) -> Predicate:
+    """Predicate that fails at evaluation time, so the rule is skipped like any other error."""
+    def fail(context, ds, memo=None):
+        raise error
+    return fail
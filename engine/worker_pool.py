@@ -0,0 +1,105 @@
+"""
+Worker Pool
+===========
+Bounded thread pool for the blocking and CPU-heavy stages of a request
+(rule evaluation, lazy data source reads, placeholder filling, Markdown →
+HTML), so async handlers await them instead of running them on the event
+loop. The loop stays free to accept requests and answer health checks
+while renders are in flight.
+
+Threads rather than processes: compiled rules and templates are closures
+that cannot be pickled, and each process would need its own copy of the
+rule snapshot and caches.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class WorkerPool:
+    """ThreadPoolExecutor with queue/active counters for saturation metrics."""
+
+    def __init__(self, max_workers: int = 8, name: str = "pipeline"):
+        """
+        Args:
+            max_workers: Threads running pipeline stages at once; further
+                calls queue until a thread is free.
+            name: Thread name prefix.
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.peak_active = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on a pool thread and await its result."""
+        submitted = time.monotonic()
+        # started: picked up by a thread; abandoned: caller gave up while queued
+        state = {"started": False, "abandoned": False}
+        with self._lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        def call():
+            waited = time.monotonic() - submitted
+            with self._lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+                self.queued -= 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+            return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, call)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self.queued -= 1
+            raise
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> dict:
+        """Saturation counters for health/metrics endpoints."""
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "saturation": round(self.active / self.max_workers, 3),
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 3) if started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+            }
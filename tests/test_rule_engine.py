@@ -23,6 +23,14 @@ resolver = MessageResolver(str(BASE / "messages"))
 ds = DataSourceResolver(mode="mock")
 
 
+def _engine_from(tmp_path, rules, templates=None, **options):
+    """Build an engine from an inline rules config."""
+    import json
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"condition_templates": templates or {}, "rules": rules}))
+    return RuleEngine(str(path), **options)
+
+
 # ═══════════════════════════════════════════
 # FEHBP Rules
 # ═══════════════════════════════════════════
@@ -180,6 +188,693 @@ def test_get_rule_not_found():
     assert engine.get_rule_by_id("NONEXISTENT") is None
 
 
+def test_evaluate_many_matches_single_evaluation():
+    """Batch evaluation returns the same matches as one-by-one evaluation, in order."""
+    contexts = [
+        {"HCCustomerType": "Member", "Policy.PolicyState": "VA", "account_type": "FEHBP"},
+        {"HCCustomerType": "Broker", "Policy.PolicyState": "CA", "account_type": "FEHBP"},
+        {},
+    ]
+    ds_batch = ds.resolve_many(contexts)
+    results = engine.evaluate_many(contexts, ds_batch)
+
+    assert ds_batch == [ds.resolve_all(c) for c in contexts]
+    assert results == [engine.evaluate(c, d) for c, d in zip(contexts, ds_batch)]
+    assert [r and r["rule_id"] for r in results[:2]] == ["R001_FEHBP_MEMBER", "R002_FEHBP_BROKER"]
+
+
+def test_evaluate_columns_matches_row_evaluation():
+    """Columnar (mask-based) evaluation gives the same rule ids as evaluate()."""
+    contexts = [
+        {"HCCustomerType": "Member", "Policy.PolicyState": "VA", "account_type": "FEHBP",
+         "IsGandAInWritingAllowed": None, "Policy.MBUCode": None},
+        {"HCCustomerType": "Broker", "Policy.PolicyState": "CA", "account_type": "FEHBP",
+         "IsGandAInWritingAllowed": None, "Policy.MBUCode": None},
+        {"HCCustomerType": "Member", "Policy.PolicyState": "TX", "account_type": "Individual",
+         "IsGandAInWritingAllowed": "Yes", "Policy.MBUCode": "IND"},
+        {"HCCustomerType": "Member", "Policy.PolicyState": "GA", "account_type": "",
+         "IsGandAInWritingAllowed": None, "Policy.MBUCode": "IND"},
+    ]
+    ds_batch = ds.resolve_many(contexts)
+    expected = [m and m["rule_id"] for m in engine.evaluate_many(contexts, ds_batch)]
+
+    columns = {key: [c[key] for c in contexts] for key in contexts[0]}
+    ds_columns = {name: [d[name] for d in ds_batch] for name in ds_batch[0]}
+
+    assert engine.evaluate_columns(columns, ds_columns) == expected
+    assert expected[:2] == ["R001_FEHBP_MEMBER", "R002_FEHBP_BROKER"]
+
+
+def test_columnar_whole_source_checks_group_rows_by_signature(tmp_path):
+    """Fresh-but-equivalent source dicts share one group; unreadable rows still error."""
+    from engine.columnar import _Batch
+
+    eng = _engine_from(tmp_path, rules=[
+        {"id": "FULL", "priority": 1, "conditions": {"source": "s", "op": "is_not_empty"}},
+        {"id": "EMPTY", "priority": 2, "conditions": {"source": "s", "op": "is_empty"}},
+    ])
+    rows = [
+        row for _ in range(50)  # Fresh dicts every time, as resolve_many() returns them
+        for row in ({"A": "x"}, {"A": ""}, {}, {"B": "y"}, "not a dict", {"A": None, "B": []})
+    ]
+    expected = [m and m["rule_id"] for m in (eng.evaluate({}, {"s": row}) for row in rows)]
+
+    assert eng.evaluate_columns({}, {"s": rows}) == expected
+    assert expected[:6] == ["FULL", "EMPTY", "EMPTY", "FULL", None, "EMPTY"]
+    groups = _Batch(eng._snapshot, {}, {"s": rows})._source_groups("s")
+    assert len(groups.values) == 4  # Three (non-empty, any value) signatures + the bad row
+
+
+def test_batch_endpoint_rejects_malformed_body_with_422():
+    """A body that isn't valid JSON is a validation error, not a server error."""
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    client = TestClient(app, raise_server_exceptions=False)
+    response = client.post(
+        "/api/evaluate/batch", content=b"{not json", headers={"content-type": "application/json"}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+    assert "input" not in response.json()["detail"][0]
+
+
+def test_compiled_sub_rules_and_templates(tmp_path):
+    """Compiled rules keep sub-rule, template and first-match semantics."""
+    eng = _engine_from(
+        tmp_path,
+        rules=[
+            {
+                "id": "PARENT", "priority": 5, "message_ref": "P",
+                "conditions": {"use_template": "is_va"},
+                "sub_rules": [
+                    {"id": "CHILD", "message_ref": "C",
+                     "conditions": {"field": "HCCustomerType", "op": "in", "val": ["Broker"]}},
+                ],
+            },
+            {"id": "MISSING_TEMPLATE", "priority": 1, "conditions": {"use_template": "nope"}},
+        ],
+        templates={"is_va": {"field": "Policy.PolicyState", "op": "eq", "val": "va"}},
+    )
+
+    child = eng.evaluate({"Policy": {"PolicyState": "VA"}, "HCCustomerType": "broker "})
+    assert child["rule_id"] == "CHILD"
+    assert child["parent_rule_id"] == "PARENT"
+    assert eng.evaluate({"Policy.PolicyState": "VA"})["rule_id"] == "PARENT"
+    assert eng.evaluate({"Policy.PolicyState": "TX"}) is None
+
+
+def test_in_lists_are_prenormalized_frozensets(tmp_path):
+    """List-valued in/not_in expectations are normalized once into frozensets."""
+    eng = _engine_from(tmp_path, rules=[
+        {"id": "IN_STATES", "priority": 1,
+         "conditions": {"field": "Policy.PolicyState", "op": "in", "val": ["MO", "wi", " NV "]}},
+        {"id": "NOT_EXCLUDED", "priority": 2,
+         "conditions": {"field": "Policy.PolicyState", "op": "not_in", "val": ["CA", "GA"]}},
+    ])
+
+    assert eng.snapshot._prepare_expected(["MO", "wi", "True"], "in") == frozenset({"mo", "wi", True})
+    assert eng.evaluate({"Policy.PolicyState": "nv"})["rule_id"] == "IN_STATES"
+    assert eng.evaluate({"Policy.PolicyState": "TX"})["rule_id"] == "NOT_EXCLUDED"
+    assert eng.evaluate({"Policy.PolicyState": "ga"}) is None
+    # Unhashable actuals never match an option (and are not an error)
+    assert eng.evaluate({"Policy.PolicyState": ["CA"]})["rule_id"] == "NOT_EXCLUDED"
+
+
+def test_field_index_skips_rules_that_cannot_match(tmp_path):
+    """Rules with mandatory equalities are only visited for matching values."""
+    eng = _engine_from(
+        tmp_path,
+        rules=[
+            {"id": "FEHBP", "priority": 1, "conditions": {"all": [
+                {"source": "account_type", "field": "AccountType", "op": "eq", "val": "FEHBP"},
+                {"field": "HCCustomerType", "op": "eq", "val": "Member"},
+            ]}},
+            {"id": "IND", "priority": 2, "conditions": {"use_template": "is_ind"}},
+            {"id": "ANY_VA", "priority": 3, "conditions": {"any": [
+                {"field": "Policy.PolicyState", "op": "eq", "val": "VA"},
+                {"field": "Policy.MBUCode", "op": "eq", "val": "IND"},
+            ]}},
+        ],
+        templates={"is_ind": {"all": [{"field": "Policy.MBUCode", "op": "in", "val": ["IND", "EXCH"]}]}},
+    )
+    ds_fehbp = {"account_type": {"AccountType": "fehbp"}}
+
+    assert list(eng.snapshot._candidates({"Policy.MBUCode": "exch"}, {})) == [1, 2]
+    assert list(eng.snapshot._candidates({"HCCustomerType": "member"}, ds_fehbp)) == [0, 2]
+    assert eng.evaluate({"HCCustomerType": "member"}, ds_fehbp)["rule_id"] == "FEHBP"
+    assert eng.evaluate({"Policy.MBUCode": "IND"}, ds_fehbp)["rule_id"] == "IND"
+    assert eng.evaluate({"Policy.PolicyState": "VA"})["rule_id"] == "ANY_VA"
+
+
+def test_shared_templates_evaluated_once_per_call(tmp_path):
+    """A template referenced by several rules is computed once per evaluate()."""
+    eng = _engine_from(
+        tmp_path,
+        rules=[
+            {"id": "R1", "priority": 1, "conditions": {"all": [
+                {"use_template": "not_b"}, {"field": "Y", "op": "is_empty"}]}},
+            {"id": "R2", "priority": 2, "conditions": {"all": [
+                {"use_template": "not_b"}, {"field": "Z", "op": "is_empty"}]}},
+            {"id": "R3", "priority": 3, "conditions": {"use_template": "not_b"}},
+        ],
+        templates={"not_b": {"field": "X", "op": "neq", "val": "b"}},
+        cache_size=0,
+    )
+
+    class CountingContext(dict):
+        reads = 0
+
+        def get(self, key, default=None):
+            if key == "X":
+                CountingContext.reads += 1
+            return super().get(key, default)
+
+    ctx = CountingContext(X="a", Y="set", Z="set")
+    assert eng.evaluate(ctx)["rule_id"] == "R3"
+    assert CountingContext.reads == 1
+
+
+def test_flattened_context_matches_nested_lookup(tmp_path):
+    """flatten_context resolves flat, nested and short-name fields like _get_field."""
+    rules = [
+        {"id": "NESTED", "priority": 1, "conditions": {"all": [
+            {"field": "Policy.PolicyState", "op": "eq", "val": "NV"},
+            {"field": "Primary.Guest.IsGuestCaller", "op": "eq", "val": False},
+        ]}},
+        {"id": "SHORT_NAME", "priority": 2, "conditions": {"field": "Policy.MBUCode", "op": "eq", "val": "IND"}},
+    ]
+    plain = _engine_from(tmp_path, rules)
+    flat = RuleEngine(str(tmp_path / "rules.json"), flatten_context=True)
+    contexts = [
+        {"Policy": {"PolicyState": "NV"}, "Primary": {"Guest": {"IsGuestCaller": False}}},
+        {"Policy.PolicyState": "NV", "Primary": {"Guest": {}}, "IsGuestCaller": "false"},
+        {"Policy": {"PolicyState": "TX"}, "MBUCode": "ind"},
+    ]
+
+    assert flat.flatten(contexts[2]) == {
+        "Policy.MBUCode": "ind", "Policy.PolicyState": "TX", "Primary.Guest.IsGuestCaller": None,
+    }
+    for ctx in contexts:
+        assert flat.evaluate(ctx) == plain.evaluate(ctx)
+    assert [plain.evaluate(c)["rule_id"] for c in contexts] == ["NESTED", "NESTED", "SHORT_NAME"]
+
+
+def test_result_cache_keyed_on_referenced_fields(tmp_path):
+    """Contexts differing only in unreferenced fields share a cache entry."""
+    eng = _engine_from(tmp_path, rules=[
+        {"id": "VA", "priority": 1, "conditions": {"field": "Policy.PolicyState", "op": "eq", "val": "VA"}},
+        {"id": "BLANK", "priority": 2, "conditions": {"field": "Note", "op": "is_empty"}},
+    ])
+
+    assert eng.evaluate({"Policy.PolicyState": "VA", "session": 1})["rule_id"] == "VA"
+    result = eng.evaluate({"Policy.PolicyState": " va", "session": 2})
+    assert result["rule_id"] == "VA"
+    assert eng.cache_stats()["hits"] == 1
+
+    # Returned dicts are copies — mutating one doesn't poison the cache
+    result["rule_id"] = "MUTATED"
+    assert eng.evaluate({"Policy.PolicyState": "VA"})["rule_id"] == "VA"
+
+    # is_empty reads raw values: " " is not empty even though it normalizes to ""
+    assert eng.evaluate({"Note": ""})["rule_id"] == "BLANK"
+    assert eng.evaluate({"Note": " "}) is None
+
+    # Reloading unchanged rules keeps the cache; changing a rule starts a fresh one
+    eng.reload()
+    assert eng.cache_stats()["size"] == 3
+    _engine_from(tmp_path, rules=[
+        {"id": "VA", "priority": 1, "conditions": {"field": "Policy.PolicyState", "op": "eq", "val": "MD"}},
+        {"id": "BLANK", "priority": 2, "conditions": {"field": "Note", "op": "is_empty"}},
+    ])
+    eng.reload()
+    assert eng.cache_stats()["size"] == 0
+
+
+def test_result_cache_skips_unhashable_source_values(tmp_path):
+    """A list or dict in a data source is evaluated uncached instead of raising."""
+    from engine.data_sources import LazyDataSources
+
+    eng = _engine_from(tmp_path, rules=[
+        {"id": "FI", "priority": 1,
+         "conditions": {"source": "group_details", "field": "FundingTypeCode", "op": "is_not_empty"}},
+    ])
+    plain = {"group_details": {"FundingTypeCode": ["E"]}}
+    assert eng.evaluate({}, plain)["rule_id"] == "FI"
+    assert eng.evaluate({}, LazyDataSources({"group_details": lambda: {"FundingTypeCode": {"E": 1}}}))["rule_id"] == "FI"
+    assert eng.evaluate({}, plain)["rule_id"] == "FI"
+    assert eng.cache_stats()["size"] == 0
+
+
+def test_reload_swaps_snapshot_atomically(tmp_path):
+    """Reload publishes a new snapshot; evaluations never see a mix of versions."""
+    import json
+    import threading
+
+    def write(version):
+        (tmp_path / "rules.json").write_text(json.dumps({
+            "condition_templates": {"is_va": {"field": "Policy.PolicyState", "op": "eq", "val": "VA"}},
+            "rules": [{"id": f"{version}_VA", "priority": 1, "conditions": {"use_template": "is_va"}}],
+        }))
+
+    write("V1")
+    eng = RuleEngine(str(tmp_path / "rules.json"), cache_size=0)
+    old = eng.snapshot
+    write("V2")
+    eng.reload()
+
+    assert old.evaluate({"Policy.PolicyState": "VA"})["rule_id"] == "V1_VA"
+    assert eng.evaluate({"Policy.PolicyState": "VA"})["rule_id"] == "V2_VA"
+
+    seen, stop = set(), threading.Event()
+
+    def evaluate_loop():
+        while not stop.is_set():
+            seen.add(eng.evaluate({"Policy.PolicyState": "VA"})["rule_id"])
+
+    worker = threading.Thread(target=evaluate_loop)
+    worker.start()
+    for i in range(20):
+        write(f"V{i % 2 + 1}")
+        eng.reload()
+    stop.set()
+    worker.join()
+    assert seen <= {"V1_VA", "V2_VA"}
+
+
+def test_incremental_reload_recompiles_only_changed_rules(tmp_path):
+    """Unchanged rules are carried over from the previous snapshot."""
+    shared = {"field": "IsASO", "op": "eq", "val": False}
+    rules = [
+        {"id": "VA", "priority": 1, "conditions": {"all": [shared, {"field": "PolicyState", "op": "eq", "val": "VA"}]}},
+        {"id": "MD", "priority": 2, "conditions": {"all": [shared, {"field": "PolicyState", "op": "eq", "val": "MD"}]}},
+    ]
+    eng = _engine_from(tmp_path, rules)
+    va_rule = eng.snapshot._compiled[0]
+
+    rules[1]["conditions"]["all"][1]["val"] = "GA"
+    _engine_from(tmp_path, rules)
+    eng.reload()
+
+    assert eng.snapshot.recompiled == 1
+    assert eng.snapshot._compiled[0] is va_rule
+    assert eng.evaluate({"IsASO": False, "PolicyState": "GA"})["rule_id"] == "MD"
+    assert eng.evaluate({"IsASO": False, "PolicyState": "MD"}) is None
+    assert eng.evaluate({"IsASO": False, "PolicyState": "VA"})["rule_id"] == "VA"
+
+
+def test_file_watcher_debounces_and_reloads_single_message(tmp_path):
+    """The watcher fires once per settled change and only for real content changes."""
+    from engine.file_watcher import FileWatcher
+
+    (tmp_path / "A.md").write_text("Alpha")
+    (tmp_path / "B.md").write_text("Beta")
+    res = MessageResolver(str(tmp_path))
+    events = []
+
+    def on_change(path, deleted):
+        events.append((path.name, deleted))
+        res.reload_file(path)
+
+    watcher = FileWatcher(debounce=0.2)
+    watcher.watch(tmp_path, on_change, pattern="*.md")
+
+    (tmp_path / "A.md").write_text("Alpha v2")
+    watcher.poll(now=0.0)
+    (tmp_path / "A.md").write_text("Alpha v2 — more")
+    watcher.poll(now=0.1)
+    watcher.poll(now=0.2)
+    assert events == []  # Still settling
+    watcher.poll(now=0.4)
+    assert events == [("A.md", False)]
+    assert res.cache["A"] == "Alpha v2 — more"
+
+    (tmp_path / "C.md").write_text("Gamma")
+    (tmp_path / "B.md").unlink()
+    watcher.poll(now=1.0)
+    watcher.poll(now=1.5)
+    assert sorted(events[1:]) == [("B.md", True), ("C.md", False)]
+    assert res.list_templates() == ["A", "C"]
+
+
+def test_precompiled_message_placeholders(tmp_path):
+    """Templates are pre-split; placeholders resolve data source → dotted key → field name."""
+    (tmp_path / "T.md").write_text("---\ntitle: T\n---\nSend to {{ addr.Line }} in {{Policy.PolicyState}}, {{Name}}. {{Gone}}")
+    res = MessageResolver(str(tmp_path))
+
+    parts = res._compiled["T"]
+    assert [p for p in parts if isinstance(p, str)] == ["Send to ", " in ", ", ", ". "]
+
+    out = res.resolve("T", {"PolicyState": "VA", "Name": "Pat", "Line": "ctx line"}, {"addr": {"Line": ""}})
+    assert out["markdown"] == "Send to ctx line in VA, Pat. [Gone]"
+    out = res.resolve("T", {"Policy.PolicyState": "MD"}, {"addr": {"Line": "PO Box 1"}})
+    assert out["markdown"] == "Send to PO Box 1 in MD, [Name]. [Gone]"
+
+
+def test_rendered_html_cached_per_resolved_values(tmp_path):
+    """HTML is rendered once per distinct values and dropped when the template changes."""
+    (tmp_path / "T.md").write_text("State: **{{PolicyState}}**")
+    res = MessageResolver(str(tmp_path))
+
+    assert res.resolve("T", {"PolicyState": "VA"})["html"] == "<p>State: <strong>VA</strong></p>"
+    assert res.resolve("T", {"PolicyState": "VA", "Other": 1})["html"] == "<p>State: <strong>VA</strong></p>"
+    assert res.resolve("T", {"PolicyState": "MD"})["html"] == "<p>State: <strong>MD</strong></p>"
+    assert res.html_cache.stats()["hits"] == 1
+
+    (tmp_path / "T.md").write_text("State: *{{PolicyState}}*")
+    res.reload_file(tmp_path / "T.md")
+    assert len(res.html_cache) == 0
+    assert res.resolve("T", {"PolicyState": "VA"})["html"] == "<p>State: <em>VA</em></p>"
+
+
+def test_markdown_converter_reused_and_reset():
+    """The per-thread converter gives the same output as a fresh markdown.markdown() call."""
+    import markdown
+    from engine.message_resolver import _converters, render_markdown
+
+    table = "| A | B |\n|---|---|\n| 1 | 2 |"
+    assert render_markdown(table) == markdown.markdown(table, extensions=["tables", "nl2br"])
+    converter = _converters.markdown
+    assert render_markdown("line one\nline two") == "<p>line one<br />\nline two</p>"
+    assert _converters.markdown is converter
+
+
+def test_markdown_only_format_skips_html():
+    """format=markdown (or Accept: text/markdown) leaves message_html out entirely."""
+    from api.chat import negotiate_format, process_evaluate
+    from api.models import EvaluateRequest
+
+    request = EvaluateRequest(context={"HCCustomerType": "Member", "Policy.PolicyState": "VA",
+                                       "account_type": "FEHBP", "IsASO": False}, format="markdown")
+    response = process_evaluate(request, engine, resolver, ds)
+    assert response.message and "message_html" not in response.model_dump(exclude_unset=True)
+
+    assert negotiate_format(None, "text/markdown") == "markdown"
+    assert negotiate_format(None, "text/html, application/json") == "html"
+    assert negotiate_format(None, "*/*") == "both"
+    assert negotiate_format("html", "text/markdown") == "html"
+
+
+def test_worker_pool_offloads_blocking_stages_with_saturation_metrics():
+    """Pipeline stages run on the bounded pool while the event loop keeps serving."""
+    import asyncio
+    import time
+
+    from api.chat import process_evaluate_async
+    from api.models import EvaluateRequest
+    from engine.data_sources import AsyncDataSourceResolver
+    from engine.worker_pool import WorkerPool
+
+    pool = WorkerPool(max_workers=1)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        heartbeat = asyncio.ensure_future(ticker())
+        slow = [asyncio.ensure_future(pool.run(time.sleep, 0.15)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        during = pool.stats()
+        request = EvaluateRequest(context={"HCCustomerType": "Member", "Policy.PolicyState": "VA",
+                                           "account_type": "FEHBP", "IsASO": False})
+        response = await process_evaluate_async(request, engine, resolver, AsyncDataSourceResolver(), pool=pool)
+        await asyncio.gather(*slow)
+        heartbeat.cancel()
+        return ticks, during, response
+
+    ticks, during, response = asyncio.run(run())
+    pool.shutdown()
+    assert response.rule_matched == "R001_FEHBP_MEMBER"
+    assert ticks >= 10  # the loop kept running through 0.3s+ of blocking work
+    assert during["active"] == 1 and during["queued"] == 1 and during["saturation"] == 1.0
+    stats = pool.stats()
+    assert stats["completed"] == 3 and stats["queued"] == 0 and stats["max_wait_ms"] >= 100
+
+
+def test_lazy_data_sources_fetched_only_when_read(tmp_path):
+    """Sources are fetched on first read, once, and only for rules actually tried."""
+    from engine.data_sources import LazyDataSources
+
+    eng = _engine_from(tmp_path, rules=[
+        {"id": "VA", "priority": 1, "conditions": {"all": [
+            {"field": "PolicyState", "op": "eq", "val": "VA"},
+            {"source": "fehbp_address", "op": "is_not_empty"},
+            {"source": "group_details", "field": "FundingTypeCode", "op": "in", "val": ["E"]},
+        ]}},
+        {"id": "ANY", "priority": 2, "conditions": {"source": "fehbp_address", "op": "is_empty"}},
+    ])
+    fetched = []
+
+    def loader(name, value):
+        return lambda: fetched.append(name) or value
+
+    def lazy():
+        return LazyDataSources({"fehbp_address": loader("fehbp_address", {}),
+                                "group_details": loader("group_details", {"FundingTypeCode": "E"})})
+
+    ds_results = lazy()
+    assert eng.evaluate({"PolicyState": "MD"}, ds_results)["rule_id"] == "ANY"
+    assert fetched == ["fehbp_address"]
+    assert {k: bool(v) for k, v in ds_results.items()} == {"fehbp_address": False}
+
+    fetched.clear()
+    assert eng.evaluate({"PolicyState": "VA"}, lazy())["rule_id"] == "ANY"
+    assert fetched == ["fehbp_address"]  # VA short-circuits before group_details
+
+    # Repeat requests hit the result cache, reading only the source the result depended on
+    fetched.clear()
+    hits = eng.cache_stats()["hits"]
+    assert eng.evaluate({"PolicyState": "VA"}, lazy())["rule_id"] == "ANY"
+    assert eng.evaluate({"PolicyState": "MD"}, lazy())["rule_id"] == "ANY"
+    assert eng.cache_stats()["hits"] == hits + 2
+    assert fetched == ["fehbp_address", "fehbp_address"]
+
+
+def test_async_data_sources_concurrent_with_partial_results():
+    """Lookups run concurrently; a source past its timeout resolves to {}."""
+    import asyncio
+    import time
+
+    import httpx
+    from engine.data_sources import AsyncDataSourceResolver
+
+    delays = {"/fehbp": 0.2, "/group": 0.2, "/account": 5.0}
+
+    async def handler(request):
+        await asyncio.sleep(delays[request.url.path])
+        return httpx.Response(200, json={"path": request.url.path})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        resolver = AsyncDataSourceResolver(
+            mode="http",
+            endpoints={"fehbp_address": "http://x/fehbp", "group_details": "http://x/group",
+                       "account_type": "http://x/account"},
+            timeouts={"account_type": 0.3},
+            client=client,
+        )
+        started = time.perf_counter()
+        results = await resolver.resolve_all({"account_type": "FEHBP"})
+        await resolver.aclose()
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+    assert results == {"fehbp_address": {"path": "/fehbp"}, "group_details": {"path": "/group"}, "account_type": {}}
+    assert elapsed < 0.6  # max of the lookups (capped by the timeout), not the sum
+
+
+def test_config_driven_connector_maps_lookup_retries_and_breaks(monkeypatch):
+    """Connectors build requests from the data_sources block, retry, then open the circuit."""
+    import asyncio
+    import json
+
+    import httpx
+    from engine.data_sources import AsyncDataSourceResolver
+
+    monkeypatch.setenv("TEST_APEX_KEY", "secret")
+    config = {"group_details": {
+        "api": {"method": "POST", "endpoint": "http://apex/v2/group/details",
+                "headers": {"apikey": "${env.TEST_APEX_KEY}"}, "backoff_seconds": 0,
+                "circuit_breaker": {"failure_threshold": 2, "reset_seconds": 60}},
+        "lookup": {"GroupID": "Policy.GroupNumber", "SubscriberID": "Subscriber.EID"},
+    }}
+    calls, statuses = [], [503, 200]
+
+    def handler(request):
+        calls.append((request.headers["apikey"], json.loads(request.content)))
+        status = statuses.pop(0) if statuses else 503
+        return httpx.Response(status, json={"FundingTypeCode": "E"})
+
+    async def run():
+        resolver = AsyncDataSourceResolver(
+            mode="http", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            data_sources=lambda: config,
+        )
+        context = {"Policy": {"GroupNumber": "G1"}, "HCCustomerType": "Member"}
+        first = await resolver.resolve_source("group_details", context)
+        failures = [await resolver.resolve_source("group_details", context) for _ in range(3)]
+        return first, failures
+
+    first, failures = asyncio.run(run())
+    assert first == {"FundingTypeCode": "E"}
+    assert calls[:2] == [("secret", {"GroupID": "G1"})] * 2  # 503 retried once
+    assert failures == [{}, {}, {}]
+    assert len(calls) == 2 + 3 + 3  # Two failing calls (3 attempts each), then the circuit is open
+
+    # "Not found" answers (404, unparsable body) are not backend failures
+    calls.clear()
+    responses = [httpx.Response(404), httpx.Response(404), httpx.Response(200, content=b"<html>"),
+                 httpx.Response(200, json={"FundingTypeCode": "A"})]
+
+    def answers(request):
+        calls.append(request.url.path)
+        return responses.pop(0)
+
+    async def lookups():
+        resolver = AsyncDataSourceResolver(
+            mode="http", client=httpx.AsyncClient(transport=httpx.MockTransport(answers)),
+            data_sources=lambda: config,
+        )
+        context = {"Policy": {"GroupNumber": "G404"}}
+        return [await resolver.resolve_source("group_details", context) for _ in range(4)]
+
+    assert asyncio.run(lookups()) == [{}, {}, {}, {"FundingTypeCode": "A"}]
+    assert len(calls) == 4
+
+
+def test_connector_timeouts_trip_breaker_and_half_open_trial_recovers():
+    """Calls cancelled by the source timeout count as failures; a timed-out trial doesn't wedge the circuit."""
+    import asyncio
+
+    import httpx
+    from engine.data_sources import AsyncDataSourceResolver
+
+    config = {"group_details": {
+        "api": {"endpoint": "http://apex/group", "retries": 0,
+                "circuit_breaker": {"failure_threshold": 1, "reset_seconds": 0.05}},
+        "lookup": {"GroupID": "Policy.GroupNumber"},
+    }}
+    hung = {"value": True}
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        if hung["value"]:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"FundingTypeCode": "E"})
+
+    async def run():
+        resolver = AsyncDataSourceResolver(
+            mode="http", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            data_sources=lambda: config, timeouts={"group_details": 0.05},
+        )
+        context = {"Policy": {"GroupNumber": "G1"}}
+        results = [await resolver.resolve_source("group_details", context)]  # times out, opens
+        results.append(await resolver.resolve_source("group_details", context))  # open: no call
+        await asyncio.sleep(0.06)
+        results.append(await resolver.resolve_source("group_details", context))  # trial times out
+        await asyncio.sleep(0.06)
+        hung["value"] = False
+        results.append(await resolver.resolve_source("group_details", context))  # next trial succeeds
+        await resolver.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert results == [{}, {}, {}, {"FundingTypeCode": "E"}]
+    assert len(calls) == 3
+
+
+def test_connector_cache_single_flight_and_negative_ttl():
+    """Identical concurrent lookups share one call; empty results expire sooner."""
+    import asyncio
+
+    import httpx
+    from engine.cache import TTLCache
+    from engine.connectors import HttpConnector
+
+    now = [0.0]
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.params["GroupID"])
+        await asyncio.sleep(0.05)
+        found = request.url.params["GroupID"] != "MISSING"
+        return httpx.Response(200, json={"AccountType": "SHBP"} if found else {})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    connector = HttpConnector(
+        "account_type",
+        {"api": {"endpoint": "http://x/account"}, "lookup": {"GroupID": "GroupNumber"},
+         "cache": {"ttl_seconds": 600, "negative_ttl_seconds": 60}},
+        lambda: client,
+        TTLCache(clock=lambda: now[0]),
+    )
+
+    async def run():
+        burst = await asyncio.gather(*(connector.fetch({"GroupNumber": "G1"}) for _ in range(20)))
+        missing = [await connector.fetch({"GroupNumber": "MISSING"}) for _ in range(2)]
+        now[0] = 120.0  # Negative entry expired, positive one still fresh
+        await connector.fetch({"GroupNumber": "MISSING"})
+        await connector.fetch({"GroupNumber": "G1"})
+        return burst, missing
+
+    burst, missing = asyncio.run(run())
+    assert burst == [{"AccountType": "SHBP"}] * 20 and missing == [{}, {}]
+    assert calls == ["G1", "MISSING", "MISSING"]
+
+
+def test_connector_micro_batches_concurrent_lookups(caplog):
+    """Lookups in one window go out as a single batch call (or a deduplicated fan-out)."""
+    import asyncio
+    import json
+
+    import httpx
+    from engine.connectors import HttpConnector
+
+    requests = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append((request.url.path, body))
+        if request.url.path == "/batch":
+            return httpx.Response(200, json={"results": [{"Group": r["GroupID"]} for r in body["requests"]]})
+        return httpx.Response(200, json={"Group": body["GroupID"]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def connector(batch):
+        return HttpConnector("group_details", {
+            "api": {"method": "POST", "endpoint": "http://x/single", "batch": batch},
+            "lookup": {"GroupID": "Policy.GroupNumber"},
+        }, lambda: client)
+
+    async def burst(conn):
+        groups = ["G1", "G2", "G1", "G3"]
+        return await asyncio.gather(*(conn.fetch({"Policy.GroupNumber": g}) for g in groups))
+
+    batched = asyncio.run(burst(connector({"window_ms": 5, "batch_endpoint": "http://x/batch"})))
+    assert [r["Group"] for r in batched] == ["G1", "G2", "G1", "G3"]
+    assert requests == [("/batch", {"requests": [{"GroupID": g} for g in ["G1", "G2", "G1", "G3"]]})]
+
+    requests.clear()
+    fanned = asyncio.run(burst(connector({"window_ms": 5, "max_concurrency": 2})))
+    assert fanned == batched
+    assert sorted(body["GroupID"] for _, body in requests) == ["G1", "G2", "G3"]
+
+    # "batch" is read from the api block; one beside "cache" is reported, not silently ignored
+    misplaced = HttpConnector("group_details", {
+        "api": {"method": "POST", "endpoint": "http://x/single"},
+        "batch": {"window_ms": 5},
+    }, lambda: client)
+    assert misplaced._batcher is None
+    assert '"batch" belongs under "api"' in caplog.text
+
+
 # ═══════════════════════════════════════════
 # Context Extractor (fallback mode)
 # ═══════════════════════════════════════════
@@ -207,6 +902,219 @@ def test_fallback_broker():
     assert ctx.get("Policy.PolicyState") == "CA"
 
 
+class _FakeCompletions:
+    """Stands in for client.chat.completions; counts LLM calls."""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    def create(self, **kwargs):
+        from types import SimpleNamespace
+
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _fake_client(completions):
+    from types import SimpleNamespace
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+def test_extraction_cache_normalizes_and_persists(tmp_path):
+    """Trivially different questions hit the cache; entries survive a restart via SQLite."""
+    from engine.cache import PersistentCache
+    from engine.context_extractor import ContextExtractor, extraction_cache_key
+
+    db = str(tmp_path / "extractions.sqlite")
+    completions = _FakeCompletions('{"HCCustomerType": "Member", "account_type": "FEHBP"}')
+    ext = ContextExtractor(api_key=None, model="gpt-4o", cache=PersistentCache(8, db))
+    ext.client = _fake_client(completions)
+
+    first = ext.extract("I'm a member with an FEHBP account")
+    first["mutated"] = True
+    second = ext.extract("  i'm a MEMBER with   an fehbp account ")
+    assert completions.calls == 1
+    assert second == {"HCCustomerType": "Member", "account_type": "FEHBP"}
+    assert ext.cache.stats()["hits"] == 1
+
+    # Model and prompt version are part of the key
+    assert extraction_cache_key("q", "gpt-4o") != extraction_cache_key("q", "gpt-4o-mini")
+    assert extraction_cache_key("q", "gpt-4o") != extraction_cache_key("q", "gpt-4o", "v0")
+
+    ext.cache.close()
+    restarted = ContextExtractor(api_key=None, model="gpt-4o", cache=PersistentCache(8, db))
+    restarted.client = _fake_client(completions)
+    assert restarted.extract("I'm a member with an FEHBP account")["account_type"] == "FEHBP"
+    assert completions.calls == 1
+    assert restarted.cache.stats()["disk_hits"] == 1
+    restarted.cache.close()
+
+
+def test_tiered_extraction_calls_llm_only_when_unsure():
+    """Confident local extractions skip the LLM; missing or conflicting fields don't."""
+    from engine.context_extractor import ContextExtractor
+    from engine.local_extractor import extract_local
+
+    local = extract_local("Provider in Texas, the member filed a complaint about a recall")
+    assert local.context["Policy.PolicyState"] == "TX"
+    assert "HCCustomerType" in local.conflicts  # provider vs member
+    assert "IsVerbalGandAAllowed" not in local.context  # "recall" is not "call"
+
+    for message in ("Member in Washington DC", "member in Washington, D.C. area",
+                    "member in Washington D.C.", "Member in the District of Columbia"):
+        dc = extract_local(message)
+        assert dc.context.get("Policy.PolicyState") != "WA", message
+        assert dc.needs_llm(), message
+    assert extract_local("Member in Washington DC, mailing from VA").needs_llm()
+    assert extract_local("Member in Washington state").context["Policy.PolicyState"] == "WA"
+
+    completions = _FakeCompletions('{"HCCustomerType": "Member", "Policy.PolicyState": "GA"}')
+    ext = ContextExtractor(api_key=None)
+    ext.client = _fake_client(completions)
+
+    ctx = ext.extract("I'm a member in Virginia with an FEHBP account, can I appeal?")
+    assert ctx["account_type"] == "FEHBP" and ctx["request_type"] == "appeal"
+    assert completions.calls == 0
+
+    assert ext.extract("How do I file a grievance?")["Policy.PolicyState"] == "GA"
+    assert ext.extract("Member in Virginia and Texas")["Policy.PolicyState"] == "GA"
+    assert completions.calls == 2
+    assert ext.stats() == {"local": 1, "llm": 2}
+
+
+def test_local_extraction_defers_negations_and_ids_to_llm():
+    """Negated cues and group numbers/IDs send the question to the LLM instead of guessing."""
+    from engine.local_extractor import extract_local
+
+    not_fehbp = extract_local("Member in Virginia, not an FEHBP account")
+    assert "account_type" not in not_fehbp.context
+    assert "account_type" in not_fehbp.conflicts and not_fehbp.needs_llm()
+
+    no_call = extract_local("Member in Virginia, I do not want to call")
+    assert "IsVerbalGandAAllowed" not in no_call.context and no_call.needs_llm()
+
+    group = extract_local("Member in Texas, group number 123456")
+    assert group.unextracted and group.needs_llm()
+    assert extract_local("Member in Texas, my subscriber ID is on the card").needs_llm()
+
+    # A negation in another clause doesn't reach the cue
+    assert not extract_local("No, I'm a member in Texas with an FEHBP account").needs_llm()
+
+
+def test_async_extraction_hedges_slow_calls_and_enforces_deadline():
+    """A call slower than the latency percentile is hedged; a stuck one falls back at the deadline."""
+    import asyncio
+    from types import SimpleNamespace
+    from engine.context_extractor import HEDGE_MIN_SAMPLES, ContextExtractor
+
+    delays = []
+
+    class SlowCompletions:
+        async def create(self, **kwargs):
+            await asyncio.sleep(delays.pop(0))
+            message = SimpleNamespace(content='{"HCCustomerType": "Broker"}')
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    ext = ContextExtractor(api_key=None, timeout=0.3, hedge_percentile=90)
+    ext.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions()))
+    ext._latencies.extend([0.01] * HEDGE_MIN_SAMPLES)
+
+    async def run():
+        delays[:] = [5, 0.01]  # primary hangs, hedge answers
+        hedged = await ext.extract_async("How do I file a grievance?")
+        delays[:] = [5]  # no hedge room left: deadline hit
+        ext.hedge_percentile = None
+        timed_out = await ext.extract_async("How do I file an appeal?")
+        return hedged, timed_out
+
+    hedged, timed_out = asyncio.run(run())
+    assert hedged == {"HCCustomerType": "Broker"}
+    assert ext.tiers["hedged"] == 1
+    assert timed_out["request_type"] == "appeal" and ext.tiers["fallback"] == 1
+
+
+def test_chat_stream_emits_each_pipeline_stage():
+    """LLM tokens stream first, then context, sources, rule, message blocks and the full response."""
+    import asyncio
+    from types import SimpleNamespace
+
+    from api.chat import stream_chat_events
+    from api.models import ChatRequest
+    from engine.context_extractor import ContextExtractor
+    from engine.data_sources import AsyncDataSourceResolver
+
+    tokens = ['{"HCCustomerType": "Member", ', '"Policy.PolicyState": "VA", ', '"account_type": "FEHBP"}']
+
+    class TokenStream:
+        def __init__(self):
+            self.pending = list(tokens)
+
+        async def __anext__(self):
+            if not self.pending:
+                raise StopAsyncIteration
+            delta = SimpleNamespace(content=self.pending.pop(0))
+            return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+        async def close(self):
+            pass
+
+    class StreamingCompletions:
+        async def create(self, stream=False, **kwargs):
+            assert stream
+            return TokenStream()
+
+    ext = ContextExtractor(api_key=None)
+    ext.async_client = SimpleNamespace(chat=SimpleNamespace(completions=StreamingCompletions()))
+
+    async def run():
+        request = ChatRequest(message="Federal employee asking about a grievance", format="markdown")
+        return [event async for event in stream_chat_events(
+            request, ext, engine, resolver, AsyncDataSourceResolver())]
+
+    events = asyncio.run(run())
+    kinds = [kind for kind, _ in events]
+    assert kinds[:3] == ["extraction_token"] * 3
+    assert kinds[3:6] == ["context", "data_sources", "rule"] and kinds[-1] == "done"
+    assert events[5][1]["rule_matched"] == "R001_FEHBP_MEMBER"
+
+    done = events[-1][1]
+    blocks = [data["markdown"] for kind, data in events if kind == "message"]
+    assert len(blocks) > 1 and "".join(blocks) == done["message"]
+    assert done["extracted_context"]["account_type"] == "FEHBP"
+
+
+def test_keyword_matcher_word_boundaries_and_leftmost_longest():
+    """One pass finds whole-word phrases; ambiguous state codes need uppercase."""
+    from engine.keyword_matcher import KeywordMatcher
+    from engine.local_extractor import extract_local
+
+    matcher = KeywordMatcher()
+    for phrase in ("call", "aso", "virginia", "west virginia", "over the phone"):
+        matcher.add(phrase, phrase)
+    matcher.add("OK", "state", case_sensitive=True)
+
+    found = matcher.find("Reason for recall: West  Virginia ASO, ok? OK, over the\nphone")
+    assert [match.phrase for match in found] == ["west virginia", "aso", "ok", "over the phone"]
+    assert [match.payloads for match in found][2] == ["state"]
+
+    assert extract_local("member in West Virginia").context["Policy.PolicyState"] == "WV"
+    assert extract_local("member in wyoming").context["Policy.PolicyState"] == "WY"
+    assert extract_local("member in tx").context["Policy.PolicyState"] == "TX"
+    assert "Policy.PolicyState" not in extract_local("oh, is it ok for me to appeal?").context
+    assert extract_local("member in OK").context["Policy.PolicyState"] == "OK"
+
+    # Titles and everyday abbreviations aren't states; uppercase ones stay weak
+    assert "Policy.PolicyState" not in extract_local("This is Ms. Smith, a member, about G&A").context
+    assert "Policy.PolicyState" not in extract_local("member, ga appeal, 5 mi away, mo").context
+    doctor = extract_local("I'm a member in Texas and my MD denied the claim")
+    assert doctor.context["Policy.PolicyState"] == "TX" and not doctor.conflicts
+    assert extract_local("member, my MD denied the claim").needs_llm()
+    assert extract_local("member in MD").context["Policy.PolicyState"] == "MD"
+
+
 if __name__ == "__main__":
     import pytest
     pytest.main([__file__, "-v"])